@@ -1,39 +1,122 @@
+import asyncio
 import json
 import lzma
+from typing import Any, AsyncIterable, Tuple
 
 import aiohttp
-import redis
+import orjson
+import redis.asyncio as redis
+from tenacity import retry, stop_after_attempt, retry_if_exception
 
-from ..Common import fetch_api_data, config
+from ..Common import fetch_api_data, config, get_cached_data, set_cached_data, write_file_if_changed, \
+    wait_for_retry_after, is_retryable_error
 
 MANIFEST_URL = "https://content.warframe.com/PublicExport/index_en.txt.lzma"  # Contains the URLs for each manifest
+MANIFEST_CACHE_KEY = f"{MANIFEST_URL}#decompressed"  # The base manifest is cached after decompression
+MAX_CONCURRENT_MANIFEST_FETCHES = 16  # Maximum number of manifest requests in flight at once
+LZMA_CHUNK_SIZE = 64 * 1024  # Number of compressed bytes fed to the LZMA decompressor at a time
+
+
+def recover_lzma_data(prefix: bytes, chunk: bytes) -> bytes:
+    """
+    Decompresses LZMA data whose prefix is known to be valid, keeping everything decoded before the first corrupt
+    byte of the chunk that follows it.
+    The decompressor can't be resumed after an error, so this replays the prefix on a fresh one and feeds the
+    failing chunk a byte at a time.
+    :param prefix: The compressed data that decoded without error.
+    :param chunk: The compressed chunk that failed to decode.
+    :return: The decompressed data.
+    """
+    decompressor = lzma.LZMADecompressor(lzma.FORMAT_AUTO)
+    results = [decompressor.decompress(prefix)]
+    for i in range(len(chunk)):
+        if decompressor.eof:
+            break
+
+        try:
+            results.append(decompressor.decompress(chunk[i:i + 1]))
+        except lzma.LZMAError:
+            break
+
+    if not any(results):
+        raise lzma.LZMAError("Data does not start with a valid LZMA/XZ stream")
+
+    return b"".join(results)
 
 
 def decompress_lzma(data: bytes) -> bytes:
     """
-    Decompresses LZMA data.
+    Decompresses LZMA data in a single pass, stopping at the end-of-stream marker or at the first corrupt byte.
+    Any trailing data after that point is ignored.
     :param data: The LZMA-compressed data.
     :return: The decompressed data.
     """
+    decompressor = lzma.LZMADecompressor(lzma.FORMAT_AUTO)
     results = []
-    while True:
-        decompressed_data = lzma.LZMADecompressor(lzma.FORMAT_AUTO, None, None)
+    for offset in range(0, len(data), LZMA_CHUNK_SIZE):
+        chunk = data[offset:offset + LZMA_CHUNK_SIZE]
         try:
-            result = decompressed_data.decompress(data)
+            results.append(decompressor.decompress(chunk))
         except lzma.LZMAError:
-            if results:
-                break  # Leftover data is not a valid LZMA/XZ stream; ignore it.
-            else:
-                raise  # Error on the first iteration; bail out.
-        results.append(result)
-        data = decompressed_data.unused_data
-        if not data:
+            return recover_lzma_data(data[:offset], chunk)
+
+        if decompressor.eof:
             break
-        if not decompressed_data.eof:
-            raise lzma.LZMAError("Compressed data ended before the end-of-stream marker was reached")
+
     return b"".join(results)
 
 
+async def decompress_lzma_stream(chunks: AsyncIterable[bytes]) -> bytes:
+    """
+    Decompresses LZMA data as it is received, stopping at the end-of-stream marker or at the first corrupt byte.
+    Any trailing data after that point is ignored.
+    :param chunks: The LZMA-compressed data, as an async iterable of chunks.
+    :return: The decompressed data.
+    """
+    decompressor = lzma.LZMADecompressor(lzma.FORMAT_AUTO)
+    received = bytearray()  # Only needed to replay the stream if it turns out to be corrupt
+    results = bytearray()
+    async for chunk in chunks:
+        try:
+            results += decompressor.decompress(chunk)
+        except lzma.LZMAError:
+            return recover_lzma_data(bytes(received), chunk)
+
+        if decompressor.eof:
+            break
+
+        received += chunk
+
+    return bytes(results)
+
+
+def parse_manifest(data: bytes) -> Any:
+    """
+    Parses a manifest, using orjson unless the manifest contains raw control characters, which only the standard
+    library parser accepts in non-strict mode.
+    :param data: The raw manifest.
+    :return: The parsed manifest.
+    """
+    try:
+        return orjson.loads(data)
+    except orjson.JSONDecodeError:
+        return json.loads(data, strict=False)
+
+
+@retry(stop=stop_after_attempt(5), wait=wait_for_retry_after, retry=retry_if_exception(is_retryable_error),
+       reraise=True)
+async def download_base_manifest(session: aiohttp.ClientSession) -> bytes:
+    """
+    Downloads the base manifest from the Warframe CDN, retrying with the same policy as make_request.
+    The manifest is decoded as it is downloaded, rather than buffering the compressed body first.
+    :param session: The aiohttp session.
+    :return: The decompressed base manifest.
+    """
+    async with session.get(MANIFEST_URL) as res:
+        res.raise_for_status()
+        return await decompress_lzma_stream(res.content.iter_chunked(LZMA_CHUNK_SIZE))
+
+
 async def fetch_base_manifest(cache: redis.Redis,
                               session: aiohttp.ClientSession) -> str:
     """
@@ -42,23 +125,12 @@ async def fetch_base_manifest(cache: redis.Redis,
     :param session: The aiohttp session.
     :return: The base manifest.
     """
-    data = await fetch_api_data(cache=cache,
-                                session=session,
-                                url=MANIFEST_URL,
-                                return_type='bytes')
+    data = await get_cached_data(cache, MANIFEST_CACHE_KEY)
+    if data is None:
+        data = await download_base_manifest(session)
+        await set_cached_data(cache, MANIFEST_CACHE_KEY, data)
 
-    byt = bytes(data)
-    length = len(data)
-    stay = True
-    while stay:
-        stay = False
-        try:
-            decompress_lzma(byt[0:length])
-        except lzma.LZMAError:
-            length -= 1
-            stay = True
-
-    return decompress_lzma(byt[0:length]).decode("utf-8")
+    return data.decode("utf-8")
 
 
 def save_manifest(manifest_dict: dict):
@@ -68,8 +140,7 @@ def save_manifest(manifest_dict: dict):
     :return: None
     """
     for item in manifest_dict:
-        with open(f"{config['output_dir']}/manifest_{item}.json", "w") as f:
-            json.dump(manifest_dict[item], f)
+        write_file_if_changed(f"{config['output_dir']}/manifest_{item}.json", orjson.dumps(manifest_dict[item]))
 
 
 async def get_manifest(cache: redis.Redis,
@@ -83,17 +154,22 @@ async def get_manifest(cache: redis.Redis,
     wf_manifest = await fetch_base_manifest(cache, session)
     wf_manifest = wf_manifest.split('\r\n')
 
-    manifest_dict = {}
-    for item in wf_manifest[:-1]:
-        url = f"http://content.warframe.com/PublicExport/Manifest/{item}"
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_MANIFEST_FETCHES)
 
-        data = await fetch_api_data(cache=cache,
-                                    session=session,
-                                    url=url,
-                                    return_type='text')
+    async def fetch_manifest(item: str) -> Tuple[str, Any]:
+        """
+        Fetches and parses a single manifest
+        :param item: manifest file name, as listed in the base manifest
+        :return: tuple of manifest name and parsed manifest
+        """
+        url = f"http://content.warframe.com/PublicExport/Manifest/{item}"
 
-        json_file = json.loads(data, strict=False)
+        async with semaphore:
+            data = await fetch_api_data(cache=cache,
+                                        session=session,
+                                        url=url,
+                                        return_type='bytes')
 
-        manifest_dict[item.split("_en")[0]] = json_file
+        return item.split("_en")[0], parse_manifest(data)
 
-    return manifest_dict
+    return dict(await asyncio.gather(*[fetch_manifest(item) for item in wf_manifest[:-1]]))
@@ -1,21 +1,27 @@
 from __future__ import annotations
 
 import asyncio
-import json
 import os
-from collections import defaultdict
+from itertools import chain
 from typing import Dict, Any, List, Tuple
 
 import aiohttp
-import redis
-from aiolimiter import AsyncLimiter
+import orjson
+import redis.asyncio as redis
 
-from market_engine.Common import logger, fetch_api_data, config, get_wfm_headers, get_statistic_path
+from market_engine.Common import logger, fetch_api_data, config, get_wfm_headers, get_statistic_path, \
+    AdaptiveConcurrencyLimiter, PacedLimiter, get_cache_key, get_cached_data_many, set_cached_data_many, \
+    save_statistic_file, write_file_if_changed
 
 API_BASE_URL = "https://api.warframe.market/v1"  # Base URL for warframe.market API
 ITEMS_ENDPOINT = "/items"  # Endpoint for fetching items
 STATISTICS_ENDPOINT = "/items/{}/statistics"  # Endpoint for fetching item statistics
-wfm_rate_limiter = AsyncLimiter(3, 1)  # Rate limiter for warframe.market API requests, 3 requests per second
+STATISTIC_STREAMS = (('statistics_closed', '90days'), ('statistics_live', '90days'))  # Statistic types and periods
+wfm_rate_limiter = PacedLimiter(3, 1)  # Rate limiter for warframe.market API requests, one request every 1/3 second
+MAX_CONCURRENT_ITEM_FETCHES = 16  # Maximum number of item statistics requests in flight at once
+wfm_concurrency_limiter = AdaptiveConcurrencyLimiter(maximum=MAX_CONCURRENT_ITEM_FETCHES)  # Adapts to API health
+CACHE_WRITE_BATCH_SIZE = 64  # Number of fetched responses to buffer before writing them to the cache in one pipeline
+PROGRESS_LOG_INTERVAL = 100  # Number of processed items between progress log messages
 
 
 async def fetch_items_from_warframe_market(cache: redis.Redis,
@@ -47,31 +53,29 @@ def parse_item_info(item_info: Dict[str, Any]) -> Dict[str, Any]:
     :param item_info: item info from warframe.market
     :return: parsed item info
     """
-    parsed_info = {'set_items': [], 'item_id': item_info['id'], 'tags': [], 'mod_max_rank': None, 'subtypes': []}
-    set_root = False
-    for item in item_info['items_in_set']:
-        if item['id'] == item_info['id']:
-            if 'set_root' in item:
-                set_root = item['set_root']
+    item_id = item_info['id']
+    parsed_info = {'set_items': [], 'item_id': item_id, 'tags': [], 'mod_max_rank': None, 'subtypes': []}
 
-            parsed_info['tags'] = item['tags']
-            if 'mod_max_rank' in item:
-                parsed_info['mod_max_rank'] = item['mod_max_rank']
+    item = next((item for item in item_info['items_in_set'] if item['id'] == item_id), None)
+    if item is None:
+        return parsed_info
 
-            if 'subtypes' in item:
-                parsed_info['subtypes'] = item['subtypes']
-        else:
-            parsed_info['set_items'].append(item['id'])
+    parsed_info['tags'] = item['tags']
+    parsed_info['mod_max_rank'] = item.get('mod_max_rank')
+    parsed_info['subtypes'] = item.get('subtypes', [])
 
-    if not set_root:
-        parsed_info['set_items'] = []
+    # Only set roots list the other items in their set, so the set is only built for them
+    if item.get('set_root', False):
+        parsed_info['set_items'] = [set_item['id'] for set_item in item_info['items_in_set']
+                                    if set_item['id'] != item_id]
 
     return parsed_info
 
 
 async def fetch_statistics_from_warframe_market(cache: redis.Redis | None,
                                                 session: aiohttp.ClientSession,
-                                                platform: str = 'pc', items: Dict = None, item_ids: Dict = None) -> \
+                                                platform: str = 'pc', items: Dict = None, item_ids: Dict = None,
+                                                record_queue: asyncio.Queue | None = None) -> \
         Tuple[Dict[str, Any], Dict[str, Any]]:
     """
     Fetches statistics from warframe.market
@@ -80,6 +84,9 @@ async def fetch_statistics_from_warframe_market(cache: redis.Redis | None,
     :param platform: platform to fetch statistics for
     :param items: list of warframe.market items, as returned by fetch_items_from_warframe_market; if None, will fetch
     :param item_ids: dictionary of item names to item ids, as returned by build_item_ids; if None, will build
+    :param record_queue: if provided, each item's statistic records are put on this queue as a list as they are
+                         processed instead of being added to the statistic history dictionary, to be consumed by
+                         MarketDatabase.insert_item_statistics_from_queue
     :return: tuple of statistic history dictionary and item info dictionary
     """
     if items is None:
@@ -88,11 +95,26 @@ async def fetch_statistics_from_warframe_market(cache: redis.Redis | None,
     if item_ids is None:
         item_ids = build_item_ids(items)
 
-    statistic_history_dict = defaultdict(lambda: defaultdict(list))
+    statistic_history_dict: Dict[str, Dict[str, List[Dict[str, Any]]]] = {}
     item_info = {}
 
-    time_periods = ['90days']
-    statistic_types = ['statistics_closed', 'statistics_live']
+    # Looks up every item's cached statistics in a single round trip, so only cache misses hit the API
+    headers = get_wfm_headers(platform)
+    urls = {item['id']: f"{API_BASE_URL}{STATISTICS_ENDPOINT.format(item['url_name'])}?include=item"
+            for item in items}
+    cache_keys = {item_id: get_cache_key(url, headers) for item_id, url in urls.items()}
+    cached_responses = dict(zip(cache_keys, await get_cached_data_many(cache, list(cache_keys.values()))))
+    pending_cache_writes = {}
+    processed_count = 0
+
+    async def flush_cache_writes() -> None:
+        """
+        Writes the buffered responses to the cache in a single pipeline
+        :return: None
+        """
+        cache_writes = pending_cache_writes.copy()
+        pending_cache_writes.clear()
+        await set_cached_data_many(cache, cache_writes)
 
     async def fetch_and_process_item_statistics(item: Dict[str, str]) -> None:
         """
@@ -100,40 +122,89 @@ async def fetch_statistics_from_warframe_market(cache: redis.Redis | None,
         :param item: item to fetch statistics for
         :return: None
         """
-        api_data = (await fetch_api_data(cache=cache,
-                                         session=session,
-                                         url=f"{API_BASE_URL}{STATISTICS_ENDPOINT.format(item['url_name'])}?include=item",
-                                         headers=get_wfm_headers(platform),
-                                         rate_limiter=wfm_rate_limiter))
-
+        response = cached_responses[item['id']]
+        if response is None:
+            # Fetches the raw response body, so it can be cached as-is and only needs to be parsed once
+            response = (await fetch_api_data(session=session,
+                                             url=urls[item['id']],
+                                             headers=headers,
+                                             rate_limiter=wfm_rate_limiter,
+                                             return_type='bytes',
+                                             concurrency_limiter=wfm_concurrency_limiter))
+
+            if response is None:
+                return
+
+            pending_cache_writes[cache_keys[item['id']]] = response
+            if len(pending_cache_writes) >= CACHE_WRITE_BATCH_SIZE:
+                await flush_cache_writes()
+
+        api_data = orjson.loads(response)
+
+        nonlocal processed_count
         item_name = item["item_name"]
 
-        logger.info(f"Processing {item_name}")
-        item_info[item['id']] = parse_item_info(api_data["include"]["item"])
-
-        # Goes through each statistic type and time period, and appends the statistic record to the dictionary
-        # Additionally, adds the item id to the statistic record, and sets the order type to closed if it is not present
-        for statistic_type in statistic_types:
-            for time_period in time_periods:
-                for statistic_record in api_data['payload'][statistic_type][time_period]:
-                    date = statistic_record["datetime"].split("T")[0]
-                    statistic_record["item_id"] = item_ids[item_name]
+        logger.debug("Processing %s", item_name)
+        processed_count += 1
+        if processed_count % PROGRESS_LOG_INTERVAL == 0:
+            logger.info(f"Processed {processed_count} of {len(items)} items")
 
-                    if 'order_type' not in statistic_record:
-                        statistic_record['order_type'] = 'closed'
+        item_info[item['id']] = parse_item_info(api_data["include"]["item"])
 
-                    statistic_history_dict[date][item_name].append(statistic_record)
+        # Goes through each statistic type and time period in a single pass, adding the item id to each statistic
+        # record, and setting the order type to closed if it is not present
+        item_id = item_ids[item_name]
+        payload = api_data['payload']
+        statistic_records = list(chain.from_iterable(payload[statistic_type][time_period]
+                                                     for statistic_type, time_period in STATISTIC_STREAMS))
+        for statistic_record in statistic_records:
+            statistic_record["item_id"] = item_id
+            statistic_record.setdefault('order_type', 'closed')
+
+        if record_queue is not None:
+            # Hands over the item's records as one batch, rather than paying a queue round trip per record
+            await record_queue.put(statistic_records)
+            return
+
+        for statistic_record in statistic_records:
+            date = statistic_record["datetime"][:10]  # ISO 8601 timestamps start with the YYYY-MM-DD date
+            day_history = statistic_history_dict.get(date)
+            if day_history is None:
+                day_history = statistic_history_dict[date] = {}
+
+            item_history = day_history.get(item_name)
+            if item_history is None:
+                item_history = day_history[item_name] = []
+
+            item_history.append(statistic_record)
 
     await asyncio.gather(*[fetch_and_process_item_statistics(item) for item in items])
+    await flush_cache_writes()
 
     return statistic_history_dict, item_info
 
 
-def save_statistic_history(statistic_history_dict: Dict[str, Dict[str, List[Dict[str, Any]]]],
-                           platform: str = 'pc') -> None:
+def save_statistic_day(filename: str, history: Dict[str, List[Dict[str, Any]]]) -> None:
     """
-    Saves the statistic history dictionary to a file, in the format of price_history_{day}.json
+    Saves a single day of statistic history, unless a file for that day already exists
+    :param filename: path of the JSON file to save, without the .gz extension
+    :param history: dictionary of item names to statistic records for the day
+    :return: None
+    """
+    # Handle file writing errors
+    try:
+        if not os.path.isfile(filename) and not os.path.isfile(f"{filename}.gz"):
+            save_statistic_file(filename, history)
+    except Exception as e:
+        logger.error(f"Error writing to file {filename}: {str(e)}")
+
+
+async def save_statistic_history(statistic_history_dict: Dict[str, Dict[str, List[Dict[str, Any]]]],
+                                 platform: str = 'pc') -> None:
+    """
+    Saves the statistic history dictionary to a file, in the format of price_history_{day}.json.gz
     Uses the platform to determine the output directory.
+    Each day is written in a worker thread, so the files are written concurrently without blocking the event loop.
     :param statistic_history_dict: statistic history dictionary, as returned by fetch_statistics_from_warframe_market
     :param platform: platform to save the statistic history for
     :return: None
@@ -142,27 +213,16 @@ def save_statistic_history(statistic_history_dict: Dict[str, Dict[str, List[Dict
 
     os.makedirs(output_dir, exist_ok=True)  # Create directory if it does not exist
 
-    for day, history in statistic_history_dict.items():
-        filename = os.path.join(output_dir, f"price_history_{day}.json")
-
-        # Handle file writing errors
-        try:
-            if not os.path.isfile(filename):
-                with open(filename, "w") as fp:
-                    json.dump(history, fp)
-        except Exception as e:
-            print(f"Error writing to file {filename}: {str(e)}")
+    await asyncio.gather(*[asyncio.to_thread(save_statistic_day,
+                                             os.path.join(output_dir, f"price_history_{day}.json"),
+                                             history)
+                           for day, history in statistic_history_dict.items()])
 
 
 def save_item_data(items, item_ids, item_info):
     output_dir = os.path.join(config['output_dir'], 'item_data')
     os.makedirs(output_dir, exist_ok=True)
 
-    with open(os.path.join(output_dir, 'items.json'), 'w') as f:
-        json.dump(items, f)
-
-    with open(os.path.join(output_dir, 'item_ids.json'), 'w') as f:
-        json.dump(item_ids, f)
-
-    with open(os.path.join(output_dir, 'item_info.json'), 'w') as f:
-        json.dump(item_info, f)
\ No newline at end of file
+    write_file_if_changed(os.path.join(output_dir, 'items.json'), orjson.dumps(items))
+    write_file_if_changed(os.path.join(output_dir, 'item_ids.json'), orjson.dumps(item_ids))
+    write_file_if_changed(os.path.join(output_dir, 'item_info.json'), orjson.dumps(item_info))
\ No newline at end of file
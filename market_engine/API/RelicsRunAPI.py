@@ -1,18 +1,23 @@
 import asyncio
-import json
 import os
+import re
+import time
+from functools import lru_cache
 from typing import Dict, List, Tuple, Any
 
 import aiohttp
-import redis
+import redis.asyncio as redis
 from aiohttp import ClientResponseError
-from bs4 import BeautifulSoup
 
-from market_engine.Common import fetch_api_data, logger, config, fix_names_and_add_ids, get_platform_path, \
-    get_statistic_path
+from market_engine.Common import fetch_api_data, logger, fix_names_and_add_ids, get_platform_path, \
+    get_statistic_path, save_statistic_file, build_id_table
 
 RELICS_RUN_BASE_URL = "https://relics.run"  # Base URL for relics.run
 RELICS_RUN_HISTORY_URL = f"{RELICS_RUN_BASE_URL}/history"  # URL for fetching statistic history
+JSON_LINK_PATTERN = re.compile(rb'href="([^"]+\.json)"')  # Matches links to JSON files in a directory listing
+MARKET_DATA_TTL = 60 * 60  # Number of seconds market data files are kept in memory
+market_data_cache: Dict[str, Tuple[float, Any]] = {}  # Market data url to the time it was fetched and its data
+MAX_CONCURRENT_HISTORY_FETCHES = 16  # Maximum number of statistic history days being fetched and saved at once
 
 def save_statistic_history(statistic_history_dict: Dict[str, Any], date: str, platform: str = 'pc') -> None:
     """
@@ -27,8 +32,7 @@ def save_statistic_history(statistic_history_dict: Dict[str, Any], date: str, pl
 
     filename = os.path.join(output_dir, date)
 
-    with open(filename, 'w') as f:
-        json.dump(statistic_history_dict, f)
+    save_statistic_file(filename, statistic_history_dict)
 
 
 async def fetch_statistics_from_relics_run(cache: redis.Redis,
@@ -47,19 +51,23 @@ async def fetch_statistics_from_relics_run(cache: redis.Redis,
     """
 
     async def fetch_data(date):
-        url = f"https://relics.run/history/{get_platform_path(platform)}{date}"
+        url = f"{RELICS_RUN_HISTORY_URL}/{get_platform_path(platform)}{date}"
 
-        try:
-            data = await fetch_api_data(session=session, url=url)
-        except ClientResponseError:
-            logger.error(f"Failed to fetch data for {url}")
-            return
+        # Bounds the number of days held in memory at once, as each one is only released once it is saved
+        async with semaphore:
+            try:
+                data = await fetch_api_data(session=session, url=url)
+            except ClientResponseError:
+                logger.error(f"Failed to fetch data for {url}")
+                return
 
-        await fix_names_and_add_ids(data, translation_dict, item_ids)
+            await fix_names_and_add_ids(data, translation_dict, item_ids, id_table)
 
-        save_statistic_history(data, date, platform)
+            await asyncio.to_thread(save_statistic_history, data, date, platform)
 
     translation_dict = await fetch_translation_dict_from_relics_run(cache, session)
+    id_table = build_id_table(translation_dict, item_ids)
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_HISTORY_FETCHES)
 
     await asyncio.gather(*[fetch_data(date) for date in date_list])
 
@@ -77,18 +85,31 @@ async def get_all_saved_dates_from_relics_run(cache: redis.Redis,
     data = await fetch_api_data(cache=cache,
                                 session=session,
                                 url=f"{RELICS_RUN_HISTORY_URL}/{get_platform_path(platform)}",
-                                return_type='text')
+                                expiration=60 * 60,
+                                return_type='bytes')
 
-    # Parses the HTML and finds all links to JSON files
-    soup = BeautifulSoup(data, 'html.parser')
+    # Finds all links to JSON files in the directory listing
+    return {match.decode() for match in JSON_LINK_PATTERN.findall(data)}
 
-    urls = set()
-    for link_obj in soup.find_all('a'):
-        link = link_obj.get('href')
-        if link.endswith('json'):
-            urls.add(link)
 
-    return urls
+@lru_cache(maxsize=8)
+def scan_saved_data(output_dir: str, mtime_ns: int) -> frozenset:
+    """
+    Scans the output directory for saved statistics. Cached on the directory's modification time, which changes
+    whenever a file is added or removed, so repeat scans of an unchanged directory are free.
+    :param output_dir: directory to scan
+    :param mtime_ns: modification time of the directory, in nanoseconds
+    :return: set of saved statistics
+    """
+    saved_data = set()
+    with os.scandir(output_dir) as entries:
+        for entry in entries:
+            if entry.name.endswith(".json.gz"):
+                saved_data.add(entry.name[:-len(".gz")])
+            elif entry.name.endswith(".json"):
+                saved_data.add(entry.name)
+
+    return frozenset(saved_data)
 
 
 def get_saved_data(platform: str = 'pc') -> set:
@@ -97,19 +118,11 @@ def get_saved_data(platform: str = 'pc') -> set:
     :param platform: platform for which to get saved statistics
     :return: set of saved statistics
     """
-    saved_data = set()
-    if not os.path.exists(config['output_dir']):
-        os.makedirs(config['output_dir'])
-
     output_dir = get_statistic_path(platform)
 
     os.makedirs(output_dir, exist_ok=True)  # Create directory if it does not exist
 
-    for file in os.listdir(get_statistic_path(platform)):
-        if file.endswith(".json"):
-            saved_data.add(file)
-
-    return saved_data
+    return set(scan_saved_data(output_dir, os.stat(output_dir).st_mtime_ns))
 
 
 async def get_dates_to_fetch(cache: redis.Redis,
@@ -123,13 +136,34 @@ async def get_dates_to_fetch(cache: redis.Redis,
     :return: set of dates to fetch
     """
     date_list = await get_all_saved_dates_from_relics_run(cache, session, platform)  # Get all possible dates
-    print(date_list)
     saved_data = get_saved_data(platform)  # Get the dates for which statistics have already been fetched
     date_list = date_list - saved_data  # Remove the dates for which statistics have already been fetched
 
     return date_list
 
 
+async def fetch_market_data(cache: redis.Redis,
+                            session: aiohttp.ClientSession,
+                            url: str) -> Any:
+    """
+    Fetches one of the relics.run market data files, which change about once a day, keeping the result in memory
+    for MARKET_DATA_TTL seconds so repeat calls skip both redis and the network.
+    :param cache: redis cache
+    :param session: aiohttp session
+    :param url: url of the market data file
+    :return: the market data
+    """
+    if url in market_data_cache:
+        fetched_at, data = market_data_cache[url]
+        if time.monotonic() - fetched_at < MARKET_DATA_TTL:
+            return data
+
+    data = await fetch_api_data(cache=cache, session=session, url=url)
+    market_data_cache[url] = (time.monotonic(), data)
+
+    return data
+
+
 async def fetch_item_ids_from_relics_run(cache: redis.Redis,
                                          session: aiohttp.ClientSession) -> Dict[str, str]:
     """
@@ -139,7 +173,7 @@ async def fetch_item_ids_from_relics_run(cache: redis.Redis,
     :return: dictionary of item names to item ids
     """
     url = f"{RELICS_RUN_BASE_URL}/market_data/item_ids.json"
-    return await fetch_api_data(cache=cache, session=session, url=url)
+    return await fetch_market_data(cache, session, url)
 
 
 async def fetch_item_info_from_relics_run(cache: redis.Redis,
@@ -151,7 +185,7 @@ async def fetch_item_info_from_relics_run(cache: redis.Redis,
     :return: dictionary of item names to item info
     """
     url = f"{RELICS_RUN_BASE_URL}/market_data/item_info.json"
-    return await fetch_api_data(cache=cache, session=session, url=url)
+    return await fetch_market_data(cache, session, url)
 
 
 async def fetch_items_from_relics_run(cache: redis.Redis,
@@ -163,7 +197,7 @@ async def fetch_items_from_relics_run(cache: redis.Redis,
     :return: list of warframe.market items
     """
     url = f"{RELICS_RUN_BASE_URL}/market_data/items.json"
-    return await fetch_api_data(cache=cache, session=session, url=url)
+    return await fetch_market_data(cache, session, url)
 
 
 async def fetch_translation_dict_from_relics_run(cache: redis.Redis,
@@ -175,7 +209,7 @@ async def fetch_translation_dict_from_relics_run(cache: redis.Redis,
     :return: Dictionary translating old/changed item names to corrected versions
     """
     url = f"{RELICS_RUN_BASE_URL}/market_data/translation_dict.json"
-    return await fetch_api_data(cache=cache, session=session, url=url)
+    return await fetch_market_data(cache, session, url)
 
 
 async def fetch_item_data_from_relics_run(cache: redis.Redis,
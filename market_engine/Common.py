@@ -1,14 +1,22 @@
+import asyncio
+import gzip
 import hashlib
 import json
 import logging
 import os
+import time
+import weakref
+from collections import deque
 from contextlib import asynccontextmanager
-from typing import Any, Dict, Union
+from functools import lru_cache
+from typing import Any, Dict, List, Tuple, Union
 
 import aiohttp
-import redis
+import orjson
+import redis.asyncio as redis
+import zstandard
 from aiolimiter import AsyncLimiter
-from tenacity import retry, stop_after_attempt, wait_fixed, wait_exponential
+from tenacity import retry, stop_after_attempt, wait_exponential, wait_random, RetryCallState, retry_if_exception
 
 # ------------------------------
 # Config
@@ -18,7 +26,10 @@ default_config: Dict[Any, Any] = {
     "redis_host": "localhost",
     "redis_port": 6379,
     "redis_db": 0,
-    "output_dir": "output"
+    "redis_max_connections": 64,
+    "output_dir": "output",
+    "http_limit": 200,
+    "http_limit_per_host": 32
 }
 
 config: Dict[Any, Any] = {}
@@ -35,14 +46,56 @@ else:
 # ------------------------------
 # Cache Functions
 
+CACHE_VALIDATOR_HEADERS = ('ETag', 'Last-Modified')  # Response headers used to revalidate an expired response
+CONDITIONAL_REQUEST_HEADERS = {'ETag': 'If-None-Match', 'Last-Modified': 'If-Modified-Since'}
+VALIDATED_RESPONSE_EXPIRATION = 7 * 24 * 60 * 60  # How long a response is kept for revalidation after it expires
+NOT_MODIFIED = object()  # Returned by send_request when the server answers a conditional request with 304
+ZSTD_MAGIC_NUMBER = b'\x28\xb5\x2f\xfd'  # Frame header that every zstd-compressed cache entry starts with
+cache_compressor = zstandard.ZstdCompressor(level=3)  # Compressor for data written to the cache
+cache_decompressor = zstandard.ZstdDecompressor()  # Decompressor for data read from the cache
+
+CACHE_POOL_TIMEOUT = 20  # Seconds to wait for a free Redis connection when the pool is exhausted
+cache_pools: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()  # Event loop to its Redis connection pool
+
+
+def get_cache_pool() -> redis.ConnectionPool:
+    """
+    Gets the Redis connection pool shared by every cache_manager on the running event loop.
+    Connections can't be shared between event loops, so each loop gets its own pool. Once every connection is in
+    use, callers wait for one to be released rather than failing.
+    :return: The Redis connection pool.
+    """
+    loop = asyncio.get_running_loop()
+    if loop not in cache_pools:
+        max_connections = int(config.get('redis_max_connections', default_config['redis_max_connections']))
+        cache_pools[loop] = redis.BlockingConnectionPool(host=config['redis_host'], port=config['redis_port'],
+                                                         db=config['redis_db'], max_connections=max_connections,
+                                                         timeout=CACHE_POOL_TIMEOUT)
+
+    return cache_pools[loop]
+
+
 @asynccontextmanager
 async def cache_manager():
     """
-    Context manager for the Redis cache.
+    Context manager for the Redis cache. Connections are taken from a shared pool, so opening a cache is cheap.
     :return: The Redis cache.
     """
-    cache = redis.Redis(host=config['redis_host'], port=config['redis_port'], db=config['redis_db'])
-    yield cache
+    cache = redis.Redis(connection_pool=get_cache_pool())
+    try:
+        yield cache
+    finally:
+        await cache.aclose()
+
+
+@lru_cache(maxsize=None)
+def get_fallback_item_id(item_name: str) -> str:
+    """
+    Gets the id used for items that have no warframe.market id, computed once per item name.
+    :param item_name: the item name
+    :return: the md5 hash of the item name
+    """
+    return hashlib.md5(item_name.encode()).hexdigest()
 
 
 def get_item_id(item_name: str, item_ids: Dict[str, str]) -> str:
@@ -55,10 +108,44 @@ def get_item_id(item_name: str, item_ids: Dict[str, str]) -> str:
     if item_name in item_ids:
         return item_ids[item_name]
 
-    return hashlib.md5(item_name.encode()).hexdigest()
+    return get_fallback_item_id(item_name)
+
+
+def compress_cache_data(data: Union[str, bytes]) -> bytes:
+    """
+    Compresses data with zstd before it is written to the cache.
+    :param data: The data to compress.
+    :return: The compressed data.
+    """
+    if isinstance(data, str):
+        data = data.encode()
+
+    return cache_compressor.compress(data)
+
+
+def decompress_cache_data(data: Union[bytes, None]) -> Union[bytes, None]:
+    """
+    Decompresses data read from the cache. Entries written before compression was added are returned as-is.
+    :param data: The data read from the cache, or None if the key was not in the cache.
+    :return: The decompressed data, or None if the key was not in the cache.
+    """
+    if data is None or not data.startswith(ZSTD_MAGIC_NUMBER):
+        return data
+
+    return cache_decompressor.decompress(data)
+
+
+def get_cache_key(url: str, headers: Dict[str, str]) -> str:
+    """
+    Gets the cache key used for the given URL and request headers.
+    :param url: The URL of the request.
+    :param headers: The headers of the request.
+    :return: The cache key.
+    """
+    return f"{url}#{headers}"
 
 
-def get_cached_data(cache: redis.Redis, url: str) -> Any:
+async def get_cached_data(cache: redis.Redis, url: str) -> Any:
     """
     Gets the cached data for the given URL.
     :param cache: The Redis cache, or None if no cache is available.
@@ -68,7 +155,7 @@ def get_cached_data(cache: redis.Redis, url: str) -> Any:
     if cache is None:
         return None
 
-    data = cache.get(url)
+    data = decompress_cache_data(await cache.get(url))
     if data is not None:
         logger.debug(f"Using cached data for {url}")
         return data
@@ -76,7 +163,20 @@ def get_cached_data(cache: redis.Redis, url: str) -> Any:
     return None
 
 
-def set_cached_data(cache: redis.Redis, cache_key: str, data: Any, expiration: int = 24 * 60 * 60) -> None:
+async def get_cached_data_many(cache: redis.Redis, cache_keys: List[str]) -> List[Any]:
+    """
+    Gets the cached data for each of the given keys with a single MGET.
+    :param cache: The Redis cache, or None if no cache is available.
+    :param cache_keys: The keys to get cached data for.
+    :return: The cached data for each key, in the same order, with None for keys not in the cache.
+    """
+    if cache is None or not cache_keys:
+        return [None] * len(cache_keys)
+
+    return [decompress_cache_data(data) for data in await cache.mget(cache_keys)]
+
+
+async def set_cached_data(cache: redis.Redis, cache_key: str, data: Any, expiration: int = 24 * 60 * 60) -> None:
     """
     Sets the cached data for the given URL.
     :param cache: The Redis cache, or None if no cache is available.
@@ -88,20 +188,298 @@ def set_cached_data(cache: redis.Redis, cache_key: str, data: Any, expiration: i
     if cache is None:
         return
 
-    cache.set(cache_key, data, ex=expiration)
+    await cache.set(cache_key, compress_cache_data(data), ex=expiration)
+
+
+async def set_cached_data_many(cache: redis.Redis, data: Dict[str, Any], expiration: int = 24 * 60 * 60) -> None:
+    """
+    Sets the cached data for each of the given keys in a single pipelined round trip.
+    :param cache: The Redis cache, or None if no cache is available.
+    :param data: Dictionary of cache keys to the data to cache.
+    :param expiration: The expiration time for cache data in seconds. Defaults to 24 * 60 * 60 (24 hours).
+    :return: None
+    """
+    if cache is None or not data:
+        return
+
+    async with cache.pipeline(transaction=False) as pipe:
+        for cache_key, value in data.items():
+            pipe.set(cache_key, compress_cache_data(value), ex=expiration)
+        await pipe.execute()
+
+
+def get_validated_response_key(cache_key: str) -> str:
+    """
+    Gets the cache key used for the validated copy of a response.
+    :param cache_key: The cache key of the response.
+    :return: The cache key of the validated copy.
+    """
+    return f"{cache_key}#validated"
+
+
+def get_conditional_headers(validated_response: Dict[bytes, bytes]) -> Dict[str, str]:
+    """
+    Gets the headers that make a request conditional on the response having changed since it was cached.
+    :param validated_response: The validated copy of the response, as returned by get_validated_response.
+    :return: The conditional request headers.
+    """
+    return {CONDITIONAL_REQUEST_HEADERS[header]: validated_response[header.encode()].decode()
+            for header in CACHE_VALIDATOR_HEADERS if header.encode() in validated_response}
+
+
+async def get_validated_response(cache: redis.Redis, cache_key: str) -> Union[Dict[bytes, bytes], None]:
+    """
+    Gets the validated copy of a response, which outlives the cached response so it can be revalidated.
+    :param cache: The Redis cache, or None if no cache is available.
+    :param cache_key: The cache key of the response.
+    :return: Dictionary of the compressed body and the cache validators, or None if there is none.
+    """
+    if cache is None:
+        return None
+
+    return await cache.hgetall(get_validated_response_key(cache_key)) or None
+
+
+async def set_response_data(cache: redis.Redis, cache_key: str, data: Any, validators: Dict[str, str],
+                            expiration: int = 24 * 60 * 60) -> None:
+    """
+    Caches a response, along with its validated copy if it has cache validators, in a single pipelined round trip,
+    compressing the body only once for both.
+    :param cache: The Redis cache, or None if no cache is available.
+    :param cache_key: The key to use for the cache.
+    :param data: The response body.
+    :param validators: The ETag and Last-Modified headers of the response.
+    :param expiration: The expiration time for cache data in seconds. Defaults to 24 * 60 * 60 (24 hours).
+    :return: None
+    """
+    if cache is None:
+        return
+
+    compressed_data = compress_cache_data(data)
+    async with cache.pipeline(transaction=False) as pipe:
+        pipe.set(cache_key, compressed_data, ex=expiration)
+        if validators:
+            validated_response_key = get_validated_response_key(cache_key)
+            pipe.delete(validated_response_key)
+            pipe.hset(validated_response_key, mapping={'body': compressed_data, **validators})
+            pipe.expire(validated_response_key, VALIDATED_RESPONSE_EXPIRATION)
+        await pipe.execute()
+
+
+# ------------------------------
+# Concurrency Control
+
+class AdaptiveConcurrencyLimiter:
+    """
+    Limits the number of requests in flight, adjusting the limit with additive-increase/multiplicative-decrease.
+    The limit grows while the average latency stays within the target, and is cut whenever the server answers
+    with a 429/5xx or the request times out.
+    """
+
+    def __init__(self, initial: float = 4, minimum: float = 1, maximum: float = 16,
+                 target_latency: float = 1.0, window: int = 32,
+                 increase: float = 0.5, decrease: float = 0.5) -> None:
+        """
+        Initializes the limiter.
+        :param initial: the starting number of concurrent requests
+        :param minimum: the lowest the limit may be cut to
+        :param maximum: the highest the limit may grow to
+        :param target_latency: the average latency in seconds below which the limit is increased
+        :param window: the number of recent latencies to average over
+        :param increase: the amount added to the limit after a fast response
+        :param decrease: the factor the limit is multiplied by after a failed response
+        """
+        self.concurrency: float = initial
+        self.minimum: float = minimum
+        self.maximum: float = maximum
+        self.target_latency: float = target_latency
+        self.increase: float = increase
+        self.decrease: float = decrease
+        self._latencies: deque = deque(maxlen=window)
+        self._in_flight: int = 0
+        self._conditions: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()  # Event loop to its condition
+
+    def _get_condition(self) -> asyncio.Condition:
+        """
+        Gets the condition for the running event loop. Conditions can't be shared between event loops, so each loop
+        gets its own.
+        :return: the condition
+        """
+        loop = asyncio.get_running_loop()
+        if loop not in self._conditions:
+            self._conditions[loop] = asyncio.Condition()
+
+        return self._conditions[loop]
+
+    def _record_success(self, latency: float) -> None:
+        """
+        Records a successful request, raising the limit if the average latency is within the target.
+        :param latency: the latency of the request in seconds
+        :return: None
+        """
+        self._latencies.append(latency)
+        if sum(self._latencies) / len(self._latencies) <= self.target_latency:
+            self.concurrency = min(self.maximum, self.concurrency + self.increase)
+
+    def _record_failure(self) -> None:
+        """
+        Records a failed request, cutting the limit.
+        :return: None
+        """
+        self.concurrency = max(self.minimum, self.concurrency * self.decrease)
+        self._latencies.clear()
+
+    @asynccontextmanager
+    async def slot(self, rate_limiter: Union[AsyncLimiter, "PacedLimiter", None] = None):
+        """
+        Waits for a free request slot, and records the outcome of the request made while holding it.
+        :param rate_limiter: an optional rate limiter to acquire once the slot is free, so its pacing is not spent
+                             while still queued for a slot; the time spent waiting on it is not counted as latency
+        :return: None
+        """
+        condition = self._get_condition()
+        async with condition:
+            await condition.wait_for(lambda: self._in_flight < int(self.concurrency))
+            self._in_flight += 1
+
+        try:
+            if rate_limiter is not None:
+                await rate_limiter.acquire()
+
+            start = time.monotonic()
+            yield
+        except asyncio.TimeoutError:
+            self._record_failure()
+            raise
+        except aiohttp.ClientResponseError as e:
+            if e.status == 429 or e.status >= 500:
+                self._record_failure()
+            raise
+        else:
+            self._record_success(time.monotonic() - start)
+        finally:
+            async with condition:
+                self._in_flight -= 1
+                condition.notify_all()
+
+
+class PacedLimiter:
+    """
+    Limits the request rate by spacing requests evenly, rather than allowing a burst of the full rate at once.
+    A drop-in replacement for aiolimiter.AsyncLimiter.
+    """
+
+    def __init__(self, max_rate: float, time_period: float = 60) -> None:
+        """
+        Initializes the limiter.
+        :param max_rate: the number of requests allowed per time period
+        :param time_period: the length of the time period in seconds
+        """
+        self.min_gap: float = time_period / max_rate
+        self._last_request: float = float('-inf')
+        self._locks: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()  # Event loop to its lock
+
+    def _get_lock(self) -> asyncio.Lock:
+        """
+        Gets the lock for the running event loop. Locks can't be shared between event loops, so each loop gets its own.
+        :return: the lock
+        """
+        loop = asyncio.get_running_loop()
+        if loop not in self._locks:
+            self._locks[loop] = asyncio.Lock()
+
+        return self._locks[loop]
+
+    async def acquire(self) -> None:
+        """
+        Waits until at least the minimum gap has passed since the previous request.
+        :return: None
+        """
+        async with self._get_lock():
+            delay = self.min_gap - (time.monotonic() - self._last_request)
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            self._last_request = time.monotonic()
 
 
 # ------------------------------
 # API Request Functions
 
+# Default wait between request attempts, jittered so requests that failed together do not all retry together
+exponential_backoff = wait_exponential(max=60) + wait_random(0, 1)
+
+
+def wait_for_retry_after(retry_state: RetryCallState) -> float:
+    """
+    Waits for the time given in the Retry-After header of a 429 response, falling back to exponential backoff.
+    :param retry_state: the tenacity retry state
+    :return: the number of seconds to wait before the next attempt
+    """
+    exception = retry_state.outcome.exception()
+    if isinstance(exception, aiohttp.ClientResponseError) and exception.status == 429 and exception.headers:
+        retry_after = exception.headers.get('Retry-After')
+        if retry_after is not None and retry_after.isdigit():
+            return float(retry_after)
+
+    return exponential_backoff(retry_state)
+
+
+def is_retryable_error(exception: BaseException) -> bool:
+    """
+    Checks whether a failed request is worth retrying. Connection errors, timeouts, rate limiting and server errors
+    are usually transient, while any other error response would only fail again.
+    :param exception: the exception raised by the request
+    :return: True if the request should be retried, otherwise False
+    """
+    if isinstance(exception, aiohttp.ClientResponseError):
+        return exception.status == 429 or exception.status >= 500
+
+    return isinstance(exception, (aiohttp.ClientError, asyncio.TimeoutError))
+
+
+sessions: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()  # Event loop to its shared aiohttp session
+
+
+def get_session() -> aiohttp.ClientSession:
+    """
+    Gets the aiohttp session shared by every session_manager on the running event loop, creating it on first use.
+    Sessions can't be shared between event loops, so each loop gets its own.
+    :return: The aiohttp session.
+    """
+    loop = asyncio.get_running_loop()
+    session = sessions.get(loop)
+    if session is None or session.closed:
+        connector = aiohttp.TCPConnector(limit=int(config.get('http_limit', default_config['http_limit'])),
+                                         limit_per_host=int(config.get('http_limit_per_host',
+                                                                       default_config['http_limit_per_host'])),
+                                         keepalive_timeout=60,  # Keep idle connections open between request bursts
+                                         ttl_dns_cache=300,
+                                         enable_cleanup_closed=True)
+        timeout = aiohttp.ClientTimeout(sock_connect=10, sock_read=30)
+        session = sessions[loop] = aiohttp.ClientSession(connector=connector, timeout=timeout)
+
+    return session
+
+
+async def close_session() -> None:
+    """
+    Closes the shared aiohttp session of the running event loop, should be called on shutdown.
+    :return: None
+    """
+    session = sessions.pop(asyncio.get_running_loop(), None)
+    if session is not None:
+        await session.close()
+
+
 @asynccontextmanager
 async def session_manager():
     """
-    The aiohttp session manager.
+    The aiohttp session manager. Yields the shared session, so connections are kept alive between calls,
+    and leaves it open on exit; use close_session to close it.
     :return: The aiohttp session.
     """
-    async with aiohttp.ClientSession() as session:
-        yield session
+    yield get_session()
 
 
 def get_wfm_headers(platform: str = 'pc', language: str = 'en'):
@@ -114,13 +492,74 @@ def get_wfm_headers(platform: str = 'pc', language: str = 'en'):
     return {'platform': platform, 'language': language}
 
 
+async def send_request(session: aiohttp.ClientSession,
+                       url: str,
+                       headers: Dict[str, str],
+                       return_type: str) -> Tuple[Any, Dict[str, str]]:
+    """
+    Sends a single GET request.
+    :param session: The aiohttp session.
+    :param url: The URL to fetch.
+    :param headers: The headers to include in the request.
+    :param return_type: The type to return, one of json, text, and bytes. JSON is returned as the raw response body.
+    :return: Tuple of the response body, or None if the URL was not found, or NOT_MODIFIED if the server answered a
+             conditional request with 304, and the response's cache validators.
+    """
+    async with session.get(url, headers=headers) as res:
+        if res.status == 404:
+            return None, {}
+
+        validators = {header: res.headers[header] for header in CACHE_VALIDATOR_HEADERS if header in res.headers}
+        if res.status == 304:
+            logger.debug(f"Data for {url} not modified")
+            return NOT_MODIFIED, validators
+
+        res.raise_for_status()
+        logger.debug(f"Fetched data for {url}")
+        if return_type == 'text':
+            return await res.text(), validators
+        elif return_type in ('json', 'bytes'):
+            return await res.read(), validators
+
+
+@retry(stop=stop_after_attempt(5), wait=wait_for_retry_after, retry=retry_if_exception(is_retryable_error),
+       reraise=True)
+async def make_request(session: aiohttp.ClientSession,
+                       url: str,
+                       headers: Dict[str, str],
+                       return_type: str,
+                       rate_limiter: Union[AsyncLimiter, PacedLimiter, None] = None,
+                       concurrency_limiter: Union[AdaptiveConcurrencyLimiter, None] = None) \
+        -> Tuple[Any, Dict[str, str]]:
+    """
+    Sends a GET request, retrying on connection errors, timeouts, rate limiting and server errors.
+    Decorated once at import time, rather than on every fetch_api_data call.
+    :param session: The aiohttp session.
+    :param url: The URL to fetch.
+    :param headers: The headers to include in the request.
+    :param return_type: The type to return, one of json, text, and bytes.
+    :param rate_limiter: An optional rate limiter to acquire before each attempt.
+    :param concurrency_limiter: An optional limiter for the number of requests in flight.
+    :return: Tuple of the response body and the response's cache validators, as returned by send_request.
+    """
+    if concurrency_limiter is None:
+        if rate_limiter is not None:
+            await rate_limiter.acquire()
+
+        return await send_request(session, url, headers, return_type)
+
+    async with concurrency_limiter.slot(rate_limiter):
+        return await send_request(session, url, headers, return_type)
+
+
 async def fetch_api_data(session: aiohttp.ClientSession,
                          url: str,
                          headers: dict[str, str] = None,
                          cache: redis.Redis = None,
                          expiration: int = 24 * 60 * 60,
-                         rate_limiter: AsyncLimiter = None,
-                         return_type: str = 'json') -> Any:
+                         rate_limiter: Union[AsyncLimiter, PacedLimiter] = None,
+                         return_type: str = 'json',
+                         concurrency_limiter: AdaptiveConcurrencyLimiter = None) -> Any:
     """
     Asynchronously fetch data from the given URL.
 
@@ -133,10 +572,13 @@ async def fetch_api_data(session: aiohttp.ClientSession,
                                                making a request. It will also store the fetched data in the cache.
                                                Defaults to None.
         expiration (int, optional): The expiration time for cache data in seconds. Defaults to 24 * 60 * 60 (24 hours).
-        rate_limiter (AsyncLimiter, optional): An optional rate limiter to use. If provided, this function will
-                                               acquire a token from the rate limiter before making a request.
-                                               Defaults to None.
+        rate_limiter (AsyncLimiter | PacedLimiter, optional): An optional rate limiter to use. If provided, this
+                                               function will acquire a token from the rate limiter before making a
+                                               request. Defaults to None.
         return_type: The type to return. Defaults to JSON. Options are JSON, text, and bytes.
+        concurrency_limiter (AdaptiveConcurrencyLimiter, optional): An optional limiter for the number of requests
+                                               in flight. If provided, each request waits for a free slot and
+                                               reports its latency or failure back to the limiter. Defaults to None.
 
     Returns:
         dict: The JSON data fetched from the URL.
@@ -148,42 +590,36 @@ async def fetch_api_data(session: aiohttp.ClientSession,
     if headers is None:
         headers = {}
 
-    data = get_cached_data(cache=cache,
-                           url=f"{url}#{headers}")
+    cache_key = get_cache_key(url, headers)
+    data = await get_cached_data(cache=cache,
+                                 url=cache_key)
     if data is None:
-        @retry(stop=stop_after_attempt(5), wait=wait_exponential(max=60))
-        async def make_request():
-            if rate_limiter is not None:
-                await rate_limiter.acquire()
+        # If an expired response is still around, only asks for the data again if it has changed since
+        validated_response = await get_validated_response(cache, cache_key)
+        request_headers = headers
+        if validated_response is not None:
+            request_headers = {**headers, **get_conditional_headers(validated_response)}
 
-            async with session.get(url, headers=headers) as res:
-                if res.status == 404:
-                    return None
+        # Makes the API request, retrying up to 5 times if it fails, backing off between attempts or waiting as long as
+        # a 429 response's Retry-After header asks
+        data, validators = await make_request(session, url, request_headers, return_type,
+                                              rate_limiter, concurrency_limiter)
 
-                res.raise_for_status()
-                logger.debug(f"Fetched data for {url}")
-                if return_type == 'json':
-                    return await res.json()
-                elif return_type == 'text':
-                    return await res.text()
-                elif return_type == 'bytes':
-                    return await res.content.read()
+        if data is NOT_MODIFIED:
+            data = decompress_cache_data(validated_response[b'body'])
+            if return_type == 'text':
+                data = data.decode()
 
-        # Makes the API request, retrying up to 5 times if it fails, waiting 1 second between each attempt
-        data = await make_request()
+            validators = validators or {key.decode(): value.decode() for key, value in validated_response.items()
+                                        if key != b'body'}
 
         # Store the data in the cache, if one is provided
-        if return_type == 'json':
-            cached_data = json.dumps(data)
-        elif return_type == 'text':
-            cached_data = str(data)
-        elif return_type == 'bytes':
-            cached_data = data
-
-        set_cached_data(cache, f"{url}#{headers}", cached_data, expiration)
-    else:
-        if return_type == 'json':
-            data = json.loads(data)
+        # JSON responses are cached as the raw response body, so they are only ever parsed, never re-serialized
+        if data is not None:
+            await set_response_data(cache, cache_key, data, validators, expiration)
+
+    if return_type == 'json' and data is not None:
+        data = orjson.loads(data)
 
     return data
 
@@ -199,23 +635,42 @@ logger = logging.getLogger()
 # ------------------------------
 # Misc Functions
 
-async def fix_names_and_add_ids(data, translation_dict, item_ids) -> None:
+def build_id_table(translation_dict: Dict[str, str], item_ids: Dict[str, str]) -> Dict[str, str]:
+    """
+    Builds a table of item names, including old names from the translation dictionary, to item ids.
+    :param translation_dict: the translation dictionary used to change old item names to new item names
+    :param item_ids: the item ids dictionary
+    :return: dictionary of item names to item ids
+    """
+    id_table = dict(item_ids)
+    for old_name, new_name in translation_dict.items():
+        id_table[old_name] = get_item_id(new_name, item_ids)
+
+    return id_table
+
+
+async def fix_names_and_add_ids(data, translation_dict, item_ids, id_table: Dict[str, str] = None) -> None:
     """
     Fixes the item names in the given data, and adds the item ids to the data.
     :param data: the statistic history data
     :param translation_dict: the translation dictionary used to change old item names to new item names
     :param item_ids: the item ids dictionary
+    :param id_table: optional table of item names to item ids, as returned by build_id_table, shared between calls.
+                     Names missing from it are resolved and added to it.
     :return: None
     """
-    for item_name in data:
-        for day in data[item_name]:
-            if item_name in translation_dict:
-                item_name = translation_dict[item_name]
+    if id_table is None:
+        id_table = {}
 
-            if 'order_type' not in day:
-                day['order_type'] = 'closed'
+    for item_name, days in data.items():
+        # Resolves the id once per item, rather than once per day
+        item_id = id_table.get(item_name)
+        if item_id is None:
+            item_id = id_table[item_name] = get_item_id(translation_dict.get(item_name, item_name), item_ids)
 
-            day["item_id"] = get_item_id(item_name, item_ids)
+        for day in days:
+            day.setdefault('order_type', 'closed')
+            day["item_id"] = item_id
 
 
 def get_platform_path(platform: str):
@@ -235,4 +690,48 @@ def get_statistic_path(platform: str):
     :param platform:
     :return:
     """
-    return os.path.join(config['output_dir'], get_platform_path(platform))
\ No newline at end of file
+    return os.path.join(config['output_dir'], get_platform_path(platform))
+
+
+def write_file_if_changed(filename: str, data: bytes) -> bool:
+    """
+    Writes data to a file, unless the file already holds exactly that data. Files regenerated on every run are
+    usually unchanged, so this skips the rewrite, only reading the existing file back when its size matches.
+    :param filename: the path of the file to write
+    :param data: the data to write
+    :return: True if the file was written, otherwise False
+    """
+    try:
+        if os.path.getsize(filename) == len(data):
+            with open(filename, "rb") as fp:
+                if fp.read() == data:
+                    return False
+    except FileNotFoundError:
+        pass
+
+    with open(filename, "wb") as fp:
+        fp.write(data)
+
+    return True
+
+
+def save_statistic_file(filename: str, data: Any) -> None:
+    """
+    Saves statistic history data to a gzip-compressed JSON file, appending .gz to the given filename.
+    :param filename: the path of the JSON file to save, without the .gz extension
+    :param data: the statistic history data to save
+    :return: None
+    """
+    with gzip.open(f"{filename}.gz", "wb", compresslevel=3) as fp:
+        fp.write(orjson.dumps(data))
+
+
+def load_statistic_file(filename: str) -> Any:
+    """
+    Loads statistic history data from a JSON file, decompressing it if the filename ends with .gz
+    :param filename: the path of the file to load
+    :return: the statistic history data
+    """
+    opener = gzip.open if filename.endswith(".gz") else open
+    with opener(filename, "rb") as fp:
+        return orjson.loads(fp.read())
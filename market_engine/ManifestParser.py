@@ -1,8 +1,9 @@
-import json
 import os
 import re
 from typing import Dict
 
+import orjson
+
 from market_engine.Common import fetch_api_data, cache_manager, session_manager
 
 # Additional categories that are exclusive to warframe.market
@@ -182,8 +183,8 @@ async def get_node_list():
     """
     # Check if exists in current folder
     if os.path.exists('solNodes.json'):
-        with open('solNodes.json', 'r') as f:
-            return json.load(f)
+        with open('solNodes.json', 'rb') as f:
+            return orjson.loads(f.read())
 
     async with cache_manager() as cache, session_manager() as session:
         return await fetch_api_data(cache=cache,
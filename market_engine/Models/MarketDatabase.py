@@ -1,18 +1,41 @@
-import json
+import asyncio
 import os
+import sys
+import tempfile
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import deque, OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime, timedelta
+from decimal import Decimal
+from functools import lru_cache
+from itertools import islice
+from operator import itemgetter
 
-from typing import Dict, List, Any, Optional, Tuple, Union
+from typing import Dict, List, Any, Optional, Tuple, Union, Iterator, Iterable, Callable
 
+import orjson
 import pymysql
 import pymysqlpool
-from fuzzywuzzy import fuzz
 from pymysql import Connection
 from pytz import timezone
+from rapidfuzz import fuzz, process
 
 from .MarketItem import MarketItem
 from .MarketUser import MarketUser
-from market_engine.Common import logger, get_statistic_path
+from market_engine.Common import logger, get_statistic_path, load_statistic_file, cache_manager, get_cached_data, \
+    set_cached_data
+
+INTERNED_STATISTIC_KEYS = ('item_id', 'order_type', 'subtype')  # String fields shared by many statistic records
+COMMON_WORDS = frozenset({'prime', 'scene', 'set'})  # Words ignored when fuzzy matching item names
+FUZZY_ITEM_CACHE_SIZE = 4096  # Maximum number of item name lookups to remember the fuzzy match for
+MIN_PREFIX_MATCH_LENGTH = 4  # Shortest query that can match an item by being the start of only its names
+BLUEPRINT_PART_WORDS = frozenset({'chassis', 'neuroptics', 'systems', 'wings', 'harness'})  # Parts whose blueprint shares their name
+CONNECTION_PING_INTERVAL = 30  # Seconds a pooled connection can sit idle before it is pinged on checkout
+QUERY_CACHE_EXPIRATION = 24 * 60 * 60  # Seconds a cached statistics query result is kept, keyed by day
 
 
 def get_item_names(item: Dict[str, Any]) -> List[str]:
@@ -24,30 +47,44 @@ def get_item_names(item: Dict[str, Any]) -> List[str]:
     return [item['item_name']] + item.get('aliases', [])
 
 
-def closest_common_word(word: str, common_words: set, threshold: int) -> Optional[str]:
+@lru_cache(maxsize=4096)
+def closest_common_word(word: str, common_words: frozenset, threshold: int) -> Optional[str]:
     """
     Returns the closest common word to the given word, if the score is above the threshold
     :param word: word to compare
-    :param common_words: set of common words to compare against
+    :param common_words: frozenset of common words to compare against
     :param threshold: minimum score for a match
     :return: closest common word if the score is above the threshold, otherwise None
     """
-    best_match, best_score = None, 0
-    for common_word in common_words:
-        score = fuzz.ratio(word, common_word)
-        if score > best_score:
-            best_match, best_score = common_word, score
+    if word in common_words:  # Exact matches are by far the most common, and need no scoring
+        return word
+
+    match = process.extractOne(word, common_words, scorer=fuzz.ratio, score_cutoff=threshold)
 
-    return best_match if best_score >= threshold else None
+    return match[0] if match is not None else None
 
 
-def remove_common_words(name: str, common_words: set) -> str:
+def remove_common_words(name: str, common_words: Iterable[str]) -> str:
     """
     Removes common words from a name
     :param name: name to remove common words from
     :param common_words: set of common words to remove
     :return: name with common words removed
     """
+    if not isinstance(common_words, frozenset):
+        common_words = frozenset(common_words)
+
+    return _remove_common_words(name, common_words)
+
+
+@lru_cache(maxsize=4096)
+def _remove_common_words(name: str, common_words: frozenset) -> str:
+    """
+    Removes common words from a name, memoized since the same names are processed for every lookup
+    :param name: name to remove common words from
+    :param common_words: frozenset of common words to remove
+    :return: name with common words removed
+    """
     name = remove_blueprint(name)
     threshold = 80  # Adjust this value based on the desired level of fuzzy matching
 
@@ -59,17 +96,21 @@ def remove_common_words(name: str, common_words: set) -> str:
     return ' '.join(filtered_words)
 
 
+@lru_cache(maxsize=4096)
 def remove_blueprint(s: str) -> str:
     """
     Removes the word 'blueprint' from the end of a string when it is preceded by a warframe/archwing part name.
     :param s: string to remove 'blueprint' from
     :return: string with 'blueprint' removed
     """
-    words = s.lower().split()
-    part_word_list = ['chassis', 'neuroptics', 'systems', 'wings', 'harness']
-    if words[-1:] == ['blueprint'] and words[-2] in part_word_list:
+    lowered = s.lower()
+    if not lowered.rstrip().endswith('blueprint'):
+        return lowered
+
+    words = lowered.split()
+    if len(words) > 1 and words[-1] == 'blueprint' and words[-2] in BLUEPRINT_PART_WORDS:
         return ' '.join(words[:-1])
-    return s.lower()
+    return lowered
 
 
 def replace_aliases(name: str, aliases: dict, threshold=80) -> str:
@@ -78,45 +119,65 @@ def replace_aliases(name: str, aliases: dict, threshold=80) -> str:
     :param name: the name to replace words in
     :param aliases: a dictionary of aliases
     :param threshold: the minimum score for a match
-    :return:
+    :return: the name with aliased words replaced by the closest alias's replacement
     """
     words = name.split()
     new_words = []
 
     for word in words:
-        for alias, replacement in aliases.items():
-            if fuzz.ratio(word, alias) >= threshold:
-                new_words.append(replacement)
-                break
-        else:  # This is executed if the loop didn't break, meaning no replacement was found
-            new_words.append(word)
+        # Exact aliases are looked up directly, only falling back to fuzzy matching when there is no exact hit
+        replacement = aliases.get(word)
+        if replacement is None and len(word) > 1:  # A single character can only match an alias exactly
+            match = process.extractOne(word, aliases.keys(), scorer=fuzz.ratio, score_cutoff=threshold)
+            if match is not None:
+                replacement = aliases[match[0]]
+
+        new_words.append(word if replacement is None else replacement)
 
     return ' '.join(new_words)
 
 
+def build_name_index(items: List[Dict[str, Any]]) -> Tuple[List[str], List[Dict[str, Any]]]:
+    """
+    Builds the processed names used for fuzzy matching, so they only need to be computed once per list of items
+    :param items: the list of items to index
+    :return: a tuple of the processed names of every item, and the item each name belongs to
+    """
+    processed_names, name_items = [], []
+    for item in items:
+        for name in get_item_names(item):
+            processed_names.append(remove_common_words(name, COMMON_WORDS))
+            name_items.append(item)
+
+    return processed_names, name_items
+
+
 def find_best_match(item_name: str, items: List[Dict[str, Any]],
-                    word_aliases: List) -> Tuple[int, Optional[Dict[str, str]]]:
+                    word_aliases: List,
+                    name_index: Optional[Tuple[List[str], List[Dict[str, Any]]]] = None) \
+        -> Tuple[int, Optional[Dict[str, str]]]:
     """
     Finds the best match for an item name from a list of items
     :param item_name: the name of the item to find a match for
     :param items: the list of items to search
     :param word_aliases: a list of word aliases
+    :param name_index: the processed names of the items, as returned by build_name_index; if None, will build
     :return: a tuple containing the best score and the best match
     """
     best_score, best_item = 0, None
-    common_words = {'prime', 'scene', 'set'}
 
     item_name = replace_aliases(item_name, word_aliases)
-    item_name = remove_common_words(item_name, common_words)
+    item_name = remove_common_words(item_name, COMMON_WORDS)
 
-    for item in items:
-        processed_names = [remove_common_words(name, common_words) for name in get_item_names(item)]
-        max_score = max(fuzz.ratio(item_name, name) for name in processed_names)
-        if max_score > best_score:
-            best_score, best_item = max_score, item
+    if name_index is None:
+        name_index = build_name_index(items)
+
+    processed_names, name_items = name_index
 
-        if best_score == 100:
-            break
+    # Scores every name in a single call, rather than looping over the items in Python
+    match = process.extractOne(item_name, processed_names, scorer=fuzz.ratio)
+    if match is not None and match[1] > best_score:
+        best_score, best_item = match[1], name_items[match[2]]
 
     return best_score, best_item
 
@@ -127,8 +188,7 @@ def open_price_history_file(filename: str) -> Dict[str, Dict[str, List[Dict[str,
     :param filename: the name of the file to open
     :return:
     """
-    with open(filename, "r") as fp:
-        return json.load(fp)
+    return load_statistic_file(filename)
 
 
 def parse_price_history(price_history: Dict[str, Dict[str, List[Dict[str, Any]]]]):
@@ -140,6 +200,12 @@ def parse_price_history(price_history: Dict[str, Dict[str, List[Dict[str, Any]]]
     data_list = []
     for item in price_history:
         for statistic_type in price_history[item]:
+            # These values repeat across thousands of records, so all records share a single string for each
+            for key in INTERNED_STATISTIC_KEYS:
+                value = statistic_type.get(key)
+                if value is not None:
+                    statistic_type[key] = sys.intern(value)
+
             data_list.append(statistic_type)
 
     return data_list
@@ -158,9 +224,9 @@ def get_file_list(date: datetime, platform: str = 'pc'):
     os.makedirs(output_directory, exist_ok=True)  # Create directory if it does not exist
 
     for file in os.listdir(output_directory):
-        if file.endswith(".json"):
+        if file.endswith(".json") or file.endswith(".json.gz"):
             if date is not None:
-                file_date = datetime.strptime(file, "price_history_%Y-%m-%d.json").date()
+                file_date = datetime.strptime(file.removesuffix(".gz"), "price_history_%Y-%m-%d.json").date()
                 if file_date <= date:
                     continue
 
@@ -169,18 +235,56 @@ def get_file_list(date: datetime, platform: str = 'pc'):
     return file_list
 
 
+def load_price_history_rows(filename: str) -> List[Dict[str, Any]]:
+    """
+    Opens a price history file and parses it into a list of statistic records, used by the worker processes
+    :param filename: the name of the file to load
+    :return: list of statistic records in the file
+    """
+    return parse_price_history(open_price_history_file(filename))
+
+
+def iter_data_list(file_list: Iterable[str], max_workers: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Lazily yields the statistic records from a list of price history files, in file order.
+    Files are parsed in a process pool, with at most two files per worker loaded ahead of the consumer.
+    :param file_list: the list of files to get data from
+    :param max_workers: the number of worker processes to use, defaults to the number of CPUs
+    :return: iterator over the statistic records in the given files
+    """
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+
+    files = iter(file_list)
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        pending = deque(executor.submit(load_price_history_rows, file) for file in islice(files, max_workers * 2))
+        while pending:
+            rows = pending.popleft().result()
+            for file in islice(files, 1):
+                pending.append(executor.submit(load_price_history_rows, file))
+
+            yield from rows
+
+
 def get_data_list(file_list: List[str]):
     """
     Gets a list of data from a list of price history files
     :param file_list: the list of files to get data from
     :return: list of data from the given files
     """
-    data_list = []
+    return list(iter_data_list(file_list))
 
-    for file in file_list:
-        data_list.extend(parse_price_history(open_price_history_file(file)))
 
-    return data_list
+def escape_load_data_value(value: Any) -> str:
+    """
+    Formats a value as a field for LOAD DATA INFILE, using the default escaping rules
+    :param value: the value to format
+    :return: the formatted field, with None written as \\N
+    """
+    if value is None:
+        return '\\N'
+
+    return str(value).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n')
 
 
 class MarketDatabase:
@@ -221,6 +325,23 @@ class MarketDatabase:
     AND platform=%s
     """
 
+    _GET_ITEM_STATISTICS_BULK_QUERY: str = """
+    SELECT item_id, datetime, avg_price
+    FROM item_statistics
+    WHERE item_id IN ({})
+    AND order_type='closed'
+    AND platform=%s
+    """
+
+    _GET_ITEM_VOLUME_BULK_QUERY: str = """
+    SELECT item_id, volume
+    FROM item_statistics
+    WHERE datetime >= NOW() - INTERVAL %s DAY
+    AND order_type='closed'
+    AND item_id IN ({})
+    AND platform=%s
+    """
+
     _BASE_ITEMS_QUERY: str = """
     SELECT items.id, items.item_name, items.item_type, items.url_name, 
     items.thumb, items.max_rank, GROUP_CONCAT(item_aliases.alias) AS aliases
@@ -258,6 +379,10 @@ class MarketDatabase:
         SELECT user_id, ingame_name FROM market_users
     """
 
+    _GET_USERS_QUERY = """
+        SELECT user_id, ingame_name FROM market_users WHERE user_id IN ({})
+    """
+
     _GET_PRICE_HISTORY_QUERY = """
     SELECT item_id, datetime, avg_price
     FROM item_statistics
@@ -333,10 +458,46 @@ class MarketDatabase:
     VALUES (%s, %s)
     """
 
+    _CREATE_ITEM_CATEGORIES_TABLE_QUERY = """
+    CREATE TEMPORARY TABLE IF NOT EXISTS tmp_item_categories (
+        item_id VARCHAR(64) PRIMARY KEY,
+        item_type VARCHAR(64)
+    ) ENGINE=MEMORY
+    """
+
+    _INSERT_ITEM_CATEGORIES_QUERY = """
+    INSERT INTO tmp_item_categories (item_id, item_type)
+    VALUES (%s, %s)
+    ON DUPLICATE KEY UPDATE item_type=VALUES(item_type)
+    """
+
     _SET_ITEM_CATEGORIES_QUERY = """
-    UPDATE items 
-    SET item_type = %s 
-    WHERE id = %s"""
+    UPDATE items
+    JOIN tmp_item_categories ON items.id = tmp_item_categories.item_id
+    SET items.item_type = tmp_item_categories.item_type
+    """
+
+    _DROP_ITEM_CATEGORIES_TABLE_QUERY = """
+    DROP TEMPORARY TABLE IF EXISTS tmp_item_categories
+    """
+
+    _ITEM_STATISTICS_COLUMNS: Tuple[str, ...] = (
+        'datetime', 'item_id', 'order_type', 'volume', 'min_price', 'max_price', 'open_price', 'closed_price',
+        'avg_price', 'wa_price', 'median', 'moving_avg', 'donch_top', 'donch_bot', 'mod_rank', 'subtype', 'id'
+    )
+
+    _INSERT_ITEM_STATISTICS_QUERY: str = f"""
+    INSERT IGNORE INTO item_statistics ({', '.join(_ITEM_STATISTICS_COLUMNS)}, platform)
+    VALUES ({', '.join(['%s'] * (len(_ITEM_STATISTICS_COLUMNS) + 1))})
+    """
+
+    _LOAD_ITEM_STATISTICS_QUERY: str = f"""
+    LOAD DATA LOCAL INFILE %s
+    IGNORE INTO TABLE item_statistics
+    FIELDS TERMINATED BY '\\t'
+    LINES TERMINATED BY '\\n'
+    ({', '.join(_ITEM_STATISTICS_COLUMNS)}, platform)
+    """
 
     _GET_LAST_AVERAGE_PRICES_QUERY = """
     SELECT i.item_name, COALESCE(s.median, 0) as last_average_price
@@ -377,26 +538,35 @@ class MarketDatabase:
     """
 
 
-    def __init__(self, user: str, password: str, host: str, database: str, initial_build: bool = False) -> None:
+    def __init__(self, user: str, password: str, host: str, database: str, initial_build: bool = False,
+                 local_infile: bool = False) -> None:
         """
         Initializes the database
         :param user: the username to connect to the database with
         :param password: the password to connect to the database with
         :param host: the host to connect to the database with
         :param database: the database to connect to
+        :param local_infile: whether to bulk load item statistics with LOAD DATA LOCAL INFILE, requires the
+                             server to have local_infile enabled
         """
         config = {'host': host, 'user': user, 'password': password, 'database': database,
-                  'autocommit': True}
+                  'autocommit': True, 'local_infile': local_infile}
+
+        self.local_infile: bool = local_infile
 
         self.pool1 = pymysqlpool.ConnectionPool(pre_create_num=2, name='pool1', **config)
 
         self.users: Dict[str, str] = {}
+        self.fuzzy_item_cache: OrderedDict = OrderedDict()  # Item name lookups to their best match, oldest use first
+        self.fuzzy_item_lock = threading.Lock()  # Guards the fuzzy item cache, which is shared by worker threads
+        self.fuzzy_item_generation: int = 0  # Bumped whenever the items or word aliases change
+        self.word_aliases: Optional[Dict[str, str]] = None  # Loaded on the first fuzzy lookup
 
         if initial_build:
             return
 
         try:
-            self.all_items = self.get_all_items()
+            self.refresh_all_items()
             self.item_price_dict = self.get_last_average_prices()
         except pymysql.err.ProgrammingError:
             logger.error("Database not initialized, database functions will not work.")
@@ -426,9 +596,25 @@ class MarketDatabase:
         :param platform: the platform to fetch data for
         :return: a dictionary mapping item names to their last average price
         """
-        results = self.execute_query(self._GET_LAST_AVERAGE_PRICES_QUERY, platform, fetch='all')
+        results = self.iter_query(self._GET_LAST_AVERAGE_PRICES_QUERY, platform)
         return {item_name.lower(): float(price) for item_name, price in results}
 
+    @contextmanager
+    def get_connection(self) -> Iterator[Connection]:
+        """
+        Checks a connection out of the pool, only pinging it first if it has been idle for longer than
+        CONNECTION_PING_INTERVAL, so queries in quick succession do not each pay for a round trip to the server
+        :return: a pooled connection, returned to the pool on exit
+        """
+        connection = self.pool1.get_connection()
+        with connection:
+            last_used = getattr(connection, 'last_used', None)
+            if last_used is None or time.monotonic() - last_used > CONNECTION_PING_INTERVAL:
+                connection.ping(reconnect=True)
+
+            yield connection
+            connection.last_used = time.monotonic()
+
     def execute_query(self, query: str, *params, fetch: str = 'all',
                       commit: bool = False, many: bool = False) -> Union[Tuple, List[Tuple], None]:
         """
@@ -440,9 +626,11 @@ class MarketDatabase:
         :param many: whether or not to execute the query with multiple parameters
         :return: the result of the query if applicable
         """
-        with self.pool1.get_connection(pre_ping=True) as con1:
+        with self.get_connection() as con1:
             with con1.cursor() as cur:
                 if many:
+                    # pymysql rewrites "INSERT ... VALUES (%s, ...)" into multi-row INSERT statements here,
+                    # so insert queries should keep that shape to avoid a round trip per row
                     cur.executemany(query, params[0])
                 else:
                     cur.execute(query, params)
@@ -455,12 +643,39 @@ class MarketDatabase:
                 elif fetch == 'all':
                     return cur.fetchall()
 
+    def iter_query(self, query: str, *params) -> Iterator[Tuple]:
+        """
+        Executes a query on the database with an unbuffered cursor, yielding rows as they are read from the server
+        rather than loading the whole result set into memory first. The connection is held until every row is read.
+        :param query: the query to execute
+        :param params: the parameters to pass to the query, accepts multiple parameters
+        :return: an iterator over the result rows
+        """
+        with self.get_connection() as connection:
+            with connection.cursor(pymysql.cursors.SSCursor) as cursor:
+                cursor.execute(query, params)
+                yield from cursor
+
+    async def execute_query_async(self, query: str, *params, fetch: str = 'all',
+                                  commit: bool = False, many: bool = False) -> Union[Tuple, List[Tuple], None]:
+        """
+        Executes a query on the database in a worker thread, so async callers do not block the event loop while
+        waiting on the database
+        :param query: the query to execute
+        :param params: the parameters to pass to the query, accepts multiple parameters
+        :param fetch: the type of fetch to perform, either 'one' or 'all'
+        :param commit: whether or not to commit the query
+        :param many: whether or not to execute the query with multiple parameters
+        :return: the result of the query if applicable
+        """
+        return await asyncio.to_thread(self.execute_query, query, *params, fetch=fetch, commit=commit, many=many)
+
     def get_all_items(self) -> List[dict]:
         """
         Gets all items from the database
         :return: a list of all items
         """
-        all_data = self.execute_query(self._GET_ALL_ITEMS_QUERY)
+        all_data = self.iter_query(self._GET_ALL_ITEMS_QUERY)
 
         all_items: List[dict] = []
         for item_id, item_name, item_type, url_name, thumb, max_rank, alias in all_data:
@@ -473,6 +688,33 @@ class MarketDatabase:
 
         return all_items
 
+    def refresh_all_items(self) -> None:
+        """
+        Reloads all items from the database, along with the lookups by id, exact name, and processed item name used
+        for matching
+        :return: None
+        """
+        all_items = self.get_all_items()
+        items_by_id = {item['id']: item for item in all_items}
+
+        # Item names take precedence over aliases, and earlier aliases over later ones, when they collide
+        items_by_name = {}
+        for item in all_items:
+            for alias in item['aliases']:
+                items_by_name.setdefault(alias.lower(), item)
+        for item in all_items:
+            items_by_name[item['item_name'].lower()] = item
+        sorted_item_names = sorted(items_by_name)  # Searched for names starting with a query
+
+        # The lookups are published together in a single assignment, as fuzzy lookups read them from worker threads
+        # and must never see a mix of old and new lookups
+        item_lookups = (all_items, items_by_id, items_by_name, sorted_item_names, build_name_index(all_items))
+        with self.fuzzy_item_lock:
+            self.all_items = all_items
+            self.item_lookups = item_lookups
+            self.fuzzy_item_cache.clear()  # Matches may have changed along with the items
+            self.fuzzy_item_generation += 1
+
     def save_items(self, items, item_ids, item_info) -> None:
         """
         Saves items to the database
@@ -489,11 +731,9 @@ class MarketDatabase:
              item_info[item['id']]['mod_max_rank'])
             for item in items if item['id'] in item_info]
 
-        new_item_ids = {}
-        for item, item_id in item_ids.items():
-            if item_id not in [x['id'] for x in items]:
-                new_item_ids[item] = item_id
-        data_list.extend([(new_item_ids[item], item, None, None, None) for item in new_item_ids])
+        existing_ids = {item['id'] for item in items}
+        data_list.extend([(item_id, item, None, None, None) for item, item_id in item_ids.items()
+                          if item_id not in existing_ids])
 
         if len(data_list) > 0:
             self.execute_query(self._INSERT_ITEM_QUERY, data_list, many=True, commit=True)
@@ -554,7 +794,7 @@ class MarketDatabase:
         Gets sub type data from the database
         :return: dictionary of item names to sub types
         """
-        sub_type_data = self.execute_query(self._GET_SUBTYPE_DATA_QUERY)
+        sub_type_data = self.iter_query(self._GET_SUBTYPE_DATA_QUERY)
 
         return {row[0]: row[1].split(',') for row in sub_type_data}
 
@@ -563,14 +803,14 @@ class MarketDatabase:
         Gets item data from the database
         :return: dictionary of item names to item ids
         """
-        return dict(self.execute_query(self._GET_ITEM_DICT_QUERY))
+        return dict(self.iter_query(self._GET_ITEM_DICT_QUERY))
 
     def get_all_sets(self) -> Dict[str, str]:
         """
         Gets all sets from the database
         :return: dictionary of set ids to set names
         """
-        return dict(self.execute_query(self._GET_ALL_SETS_QUERY))
+        return dict(self.iter_query(self._GET_ALL_SETS_QUERY))
 
     def save_item_categories(self, item_categories: Dict[str, Dict[str, str]]) -> None:
         """
@@ -581,53 +821,120 @@ class MarketDatabase:
         if item_categories is None:
             return None
 
-        for item_type in item_categories:
-            self.execute_query(self._SET_ITEM_CATEGORIES_QUERY,
-                               [(item_type, item_id) for item_id in item_categories[item_type].values()],
-                               many=True, commit=True)
+        data_list = [(item_id, item_type)
+                     for item_type in item_categories
+                     for item_id in item_categories[item_type].values()]
+
+        if len(data_list) == 0:
+            return None
+
+        # The temporary table only exists on the connection that created it, so every step shares one connection
+        with self.get_connection() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute(self._CREATE_ITEM_CATEGORIES_TABLE_QUERY)
+                try:
+                    cursor.executemany(self._INSERT_ITEM_CATEGORIES_QUERY, data_list)
+                    cursor.execute(self._SET_ITEM_CATEGORIES_QUERY)
+                finally:
+                    cursor.execute(self._DROP_ITEM_CATEGORIES_TABLE_QUERY)
+            connection.commit()
 
     def insert_item_statistics(self, last_save_date: datetime = None,
                                platform: str = 'pc') -> None:
         """
-        Inserts item statistics into the database
+        Inserts item statistics into the database, streaming the price history files in batches
         :param last_save_date: the date to fetch files after
         :param platform: the platform to fetch files for
         :return: None
         """
         file_list = get_file_list(last_save_date, platform)
-        data_list = get_data_list(file_list)
+        self.insert_item_statistic_records(iter_data_list(file_list), platform)
 
-        if len(data_list) == 0:
-            return
+    def insert_item_statistic_records(self, records: Iterable[Dict[str, Any]], platform: str = 'pc',
+                                      batch_size: int = 10_000) -> None:
+        """
+        Inserts statistic records into the database in batches, consuming the records lazily
+        :param records: the statistic records to insert
+        :param platform: the platform the records belong to
+        :param batch_size: the number of records to insert per batch
+        :return: None
+        """
+        records = iter(records)
+        with self.get_connection() as connection:
+            with connection.cursor() as cursor:
+                batch_num = 0
+                while batch := list(islice(records, batch_size)):
+                    batch_num += 1
+                    self._insert_item_statistics_batch(cursor, batch, platform)
+                    logger.info(f"Progress: Batch {batch_num} completed")
+            connection.commit()
+
+    async def insert_item_statistics_from_queue(self, queue: asyncio.Queue, platform: str = 'pc',
+                                                batch_size: int = 10_000) -> None:
+        """
+        Drains statistic records from a queue into the database, inserting them in batches off the event loop.
+        Stops once None is taken from the queue.
+        :param queue: the queue of lists of statistic records, as filled by fetch_statistics_from_warframe_market
+        :param platform: the platform the records belong to
+        :param batch_size: the number of records to insert per batch
+        :return: None
+        """
+        batch = []
+        while (records := await queue.get()) is not None:
+            batch.extend(records)
+            if len(batch) >= batch_size:
+                await asyncio.to_thread(self.insert_item_statistic_records, batch, platform, batch_size)
+                batch = []
 
-        # Get the union of all keys in the data_list
-        all_columns = set().union(*(data.keys() for data in data_list))
-        columns_str = ', '.join(all_columns)
-        placeholders = ', '.join(['%s'] * len(all_columns))
-        columns_str += ', platform'
-        placeholders += ', %s'
+        if batch:
+            await asyncio.to_thread(self.insert_item_statistic_records, batch, platform, batch_size)
 
-        insert_query = f"""
-            INSERT IGNORE INTO item_statistics ({columns_str})
-            VALUES ({placeholders})
+    def _insert_item_statistics_batch(self, cursor, data_list: List[Dict[str, Any]], platform: str) -> None:
         """
+        Inserts a single batch of statistic records into the database
+        :param cursor: the cursor to execute the insert with
+        :param data_list: the statistic records to insert
+        :param platform: the platform the records belong to
+        :return: None
+        """
+        columns = self._ITEM_STATISTICS_COLUMNS
 
-        # Create a list of values for each dictionary, using None for missing keys
+        # Fill in None for missing keys, so each row can be read with a single itemgetter call
         for data in data_list:
             if 'order_type' not in data:
                 data['order_type'] = 'closed'
 
-        values = [tuple(data.get(key, None) for key in all_columns) + (platform,) for data in data_list]
+            for key in columns:
+                data.setdefault(key, None)
+
+            if len(data) > len(columns):
+                logger.debug(f"Ignoring unknown statistic keys: {set(data) - set(columns)}")
 
-        batch_size = 10_000
-        total_batches = (len(values) + batch_size - 1) // batch_size
+        get_row = itemgetter(*columns)
+        values = [get_row(data) + (platform,) for data in data_list]
 
-        with self.connection.cursor() as cursor:
-            for i in range(0, len(values), batch_size):
-                batch_values = values[i:i + batch_size]
-                cursor.executemany(insert_query, batch_values)
-                logger.info(f"Progress: Batch {i // batch_size + 1} of {total_batches} completed")
-            self.connection.commit()
+        if self.local_infile:
+            self._load_item_statistics_rows(cursor, values)
+        else:
+            cursor.executemany(self._INSERT_ITEM_STATISTICS_QUERY, values)
+
+    def _load_item_statistics_rows(self, cursor, values: List[Tuple[Any, ...]]) -> None:
+        """
+        Bulk loads statistic rows into the database by writing them to a temporary tab-separated file
+        and loading it with LOAD DATA LOCAL INFILE
+        :param cursor: the cursor to execute the load with
+        :param values: the rows to load, in the order of _ITEM_STATISTICS_COLUMNS followed by the platform
+        :return: None
+        """
+        with tempfile.NamedTemporaryFile("w", suffix=".tsv", delete=False, encoding="utf-8") as fp:
+            for row in values:
+                fp.write('\t'.join(escape_load_data_value(value) for value in row))
+                fp.write('\n')
+
+        try:
+            cursor.execute(self._LOAD_ITEM_STATISTICS_QUERY, (fp.name,))
+        finally:
+            os.remove(fp.name)
 
     def get_most_recent_statistic_date(self, platform: str = 'pc') -> Optional[datetime]:
         """
@@ -657,7 +964,7 @@ class MarketDatabase:
         :param fetch_reviews: whether or not to fetch reviews from the API
         :return: the user if applicable, otherwise None
         """
-        result = self.execute_query(self._GET_CORRECT_CASE_QUERY, user, fetch='one')
+        result = await self.execute_query_async(self._GET_CORRECT_CASE_QUERY, user, fetch='one')
 
         if result is None:
             # Username not found, attempt to fetch from API
@@ -694,15 +1001,14 @@ class MarketDatabase:
         :param platform: the platform to fetch data for
         :return: the item if applicable, otherwise None
         """
-        fuzzy_item = self._get_fuzzy_item(item)  # Get the best match for the item name
+        # Get the best match for the item name, in a worker thread as it queries the word aliases
+        fuzzy_item = await asyncio.to_thread(self._get_fuzzy_item, item)
 
         if fuzzy_item is None:  # No match found
             return None
 
-        item_data: List[str] = list(fuzzy_item.values())  # Get the item data from the dictionary
-
         # Creates the item object, fetching data from the API if applicable
-        return await MarketItem.create(self, *item_data,
+        return await self._create_item(fuzzy_item,
                                        fetch_parts=fetch_parts,
                                        fetch_orders=fetch_orders,
                                        fetch_part_orders=fetch_part_orders,
@@ -710,6 +1016,48 @@ class MarketDatabase:
                                        fetch_demand_history=fetch_demand_history,
                                        platform=platform)
 
+    async def get_items(self, items: List[str], fetch_orders: bool = True,
+                        fetch_parts: bool = True, fetch_part_orders: bool = True,
+                        fetch_price_history: bool = True, fetch_demand_history: bool = True,
+                        platform: str = 'pc') -> List[Optional[MarketItem]]:
+        """
+        Gets several items from the database at once, matching every name in a single worker thread and fetching
+        each matched item's data concurrently. Names that match the same item share one MarketItem.
+        :param items: the items to get
+        :param fetch_orders: whether or not to fetch orders from the API
+        :param fetch_parts: whether or not to fetch parts from the API
+        :param fetch_part_orders: whether or not to fetch part orders from the API
+        :param fetch_price_history: whether or not to fetch price history from the database
+        :param fetch_demand_history: whether or not to fetch demand history from the database
+        :param platform: the platform to fetch data for
+        :return: the item for each name if applicable, otherwise None, in the same order as the names
+        """
+        fuzzy_items = await asyncio.to_thread(lambda: [self._get_fuzzy_item(item) for item in items])
+
+        # Creates each matched item once, even if several names matched it
+        unique_items = {fuzzy_item['id']: fuzzy_item for fuzzy_item in fuzzy_items if fuzzy_item is not None}
+        market_items = await asyncio.gather(*[self._create_item(fuzzy_item,
+                                                                fetch_parts=fetch_parts,
+                                                                fetch_orders=fetch_orders,
+                                                                fetch_part_orders=fetch_part_orders,
+                                                                fetch_price_history=fetch_price_history,
+                                                                fetch_demand_history=fetch_demand_history,
+                                                                platform=platform)
+                                              for fuzzy_item in unique_items.values()])
+        items_by_id = dict(zip(unique_items, market_items))
+
+        return [None if fuzzy_item is None else items_by_id[fuzzy_item['id']] for fuzzy_item in fuzzy_items]
+
+    async def _create_item(self, item: Dict[str, Any], **kwargs) -> MarketItem:
+        """
+        Creates a MarketItem from one of the item dictionaries in self.all_items
+        :param item: the item dictionary, as returned by get_all_items
+        :param kwargs: the options to pass on to MarketItem.create
+        :return: the item
+        """
+        return await MarketItem.create(self, item['id'], item['item_name'], item['item_type'], item['url_name'],
+                                       item['thumb'], item['max_rank'], item['aliases'], **kwargs)
+
     def get_item_statistics(self, item_id: str, platform: str = 'pc') -> Tuple[Tuple[Any, ...], ...]:
         """
         Gets item statistics from the database
@@ -719,6 +1067,72 @@ class MarketDatabase:
         """
         return self.execute_query(self._GET_ITEM_STATISTICS_QUERY, item_id, platform, fetch='all')
 
+    async def get_cached_query(self, cache_key: str, column_parsers: Tuple[Callable[[str], Any], ...],
+                               query: str, *params) -> Tuple[Tuple[Any, ...], ...]:
+        """
+        Gets the result of a query from the cache, running it on the database and caching it on a miss. The day is
+        part of the key, so a result is never served past the day it was read on.
+        Datetimes and Decimals are cached as strings, and are turned back into their original types with the
+        column's parser, so cached and uncached results are the same.
+        :param cache_key: the key to cache the result under, without the day
+        :param column_parsers: a parser for each column of the result, applied to the values cached as strings
+        :param query: the query to execute
+        :param params: the parameters to pass to the query, accepts multiple parameters
+        :return: the result of the query, as returned by execute_query
+        """
+        cache_key = f"{cache_key}:{datetime.now().date().isoformat()}"
+
+        async with cache_manager() as cache:
+            data = await get_cached_data(cache, cache_key)
+            if data is None:
+                rows = await self.execute_query_async(query, *params, fetch='all')
+                await set_cached_data(cache, cache_key, orjson.dumps(rows, default=str),
+                                      expiration=QUERY_CACHE_EXPIRATION)
+                return rows
+
+        return tuple(tuple(parser(value) if isinstance(value, str) else value
+                           for parser, value in zip(column_parsers, row))
+                     for row in orjson.loads(data))
+
+    async def get_item_statistics_cached(self, item_id: str, platform: str = 'pc') -> Tuple[Tuple[Any, ...], ...]:
+        """
+        Gets item statistics through the cache, so repeat reads on the same day skip the database
+        :param item_id: the item to get statistics for
+        :param platform: the platform to fetch data for
+        :return: the item statistics, as returned by get_item_statistics
+        """
+        return await self.get_cached_query(f"item_statistics:{platform}:{item_id}",
+                                           (datetime.fromisoformat, Decimal),
+                                           self._GET_ITEM_STATISTICS_QUERY, item_id, platform)
+
+    async def get_item_volume_cached(self, item_id: str, days: int = 31,
+                                     platform: str = 'pc') -> Tuple[Tuple[Any, ...], ...]:
+        """
+        Gets item volume through the cache, so repeat reads on the same day skip the database
+        :param item_id: the item to get volume for
+        :param days: the number of days to get volume for
+        :param platform: the platform to fetch data for
+        :return: the item volume, as returned by get_item_volume
+        """
+        return await self.get_cached_query(f"item_volume:{platform}:{item_id}:{days}", (Decimal,),
+                                           self._GET_ITEM_VOLUME_QUERY, days, item_id, platform)
+
+    def get_item_statistics_columns(self, item_id: str, platform: str = 'pc') -> Tuple[List[datetime], array]:
+        """
+        Gets item statistics from the database as columns rather than rows, with the prices packed into a float
+        array so numeric aggregation over long histories does not go through a Python object per value
+        :param item_id: the item to get statistics for
+        :param platform: the platform to fetch data for
+        :return: tuple of the statistic datetimes and their average prices, with missing prices as NaN
+        """
+        datetimes = []
+        avg_prices = array('d')
+        for stat_datetime, avg_price in self.iter_query(self._GET_ITEM_STATISTICS_QUERY, item_id, platform):
+            datetimes.append(stat_datetime)
+            avg_prices.append(float('nan') if avg_price is None else avg_price)
+
+        return datetimes, avg_prices
+
     def get_item_volume(self, item_id: str, days: int = 31, platform: str = 'pc') -> Tuple[Tuple[Any, ...], ...]:
         """
         Gets item volume from the database
@@ -729,6 +1143,51 @@ class MarketDatabase:
         """
         return self.execute_query(self._GET_ITEM_VOLUME_QUERY, days, item_id, platform, fetch='all')
 
+    def get_item_statistics_bulk(self, item_ids: List[str],
+                                 platform: str = 'pc') -> Dict[str, List[Tuple[Any, ...]]]:
+        """
+        Gets item statistics for many items from the database in a single query
+        :param item_ids: the items to get statistics for
+        :param platform: the platform to fetch data for
+        :return: dictionary of item ids to their statistics, in the same form as get_item_statistics
+        """
+        if not item_ids:
+            return {}
+
+        placeholders = ','.join(['%s'] * len(item_ids))
+        query = self._GET_ITEM_STATISTICS_BULK_QUERY.format(placeholders)
+
+        statistics = {}
+        for item_id, *row in self.iter_query(query, *item_ids, platform):
+            if item_id not in statistics:
+                statistics[item_id] = []
+            statistics[item_id].append(tuple(row))
+
+        return statistics
+
+    def get_item_volume_bulk(self, item_ids: List[str], days: int = 31,
+                             platform: str = 'pc') -> Dict[str, List[Tuple[Any, ...]]]:
+        """
+        Gets item volume for many items from the database in a single query
+        :param item_ids: the items to get volume for
+        :param days: the number of days to get volume for
+        :param platform: the platform to fetch data for
+        :return: dictionary of item ids to their volume, in the same form as get_item_volume
+        """
+        if not item_ids:
+            return {}
+
+        placeholders = ','.join(['%s'] * len(item_ids))
+        query = self._GET_ITEM_VOLUME_BULK_QUERY.format(placeholders)
+
+        volume = {}
+        for item_id, *row in self.iter_query(query, days, *item_ids, platform):
+            if item_id not in volume:
+                volume[item_id] = []
+            volume[item_id].append(tuple(row))
+
+        return volume
+
     def get_item_price_history(self, item_ids: List[str], platform: str = 'pc') -> Dict[str, Dict[str, str]]:
         """
         Gets item price history from the database
@@ -738,7 +1197,7 @@ class MarketDatabase:
         """
         placeholders = ','.join(['%s'] * len(item_ids))
         query = self._GET_PRICE_HISTORY_QUERY.format(placeholders)
-        results = self.execute_query(query, *item_ids, platform, fetch='all')
+        results = self.iter_query(query, *item_ids, platform)
 
         price_history = {}
         for item_id, datetime, avg_price in results:
@@ -781,7 +1240,7 @@ class MarketDatabase:
         """
         placeholders = ','.join(['%s'] * len(item_ids))
         query = self._GET_DEMAND_HISTORY_QUERY.format(placeholders)
-        results = self.execute_query(query, *item_ids, platform, fetch='all')
+        results = self.iter_query(query, *item_ids, platform)
 
         demand_history = {}
         for item_id, datetime, volume in results:
@@ -800,10 +1259,7 @@ class MarketDatabase:
         """
         placeholders = ','.join(['%s'] * len(item_ids))
         query = self._GET_AVERAGE_DEMAND_QUERY.format(placeholders)
-        results = self.execute_query(query, *item_ids, platform, fetch='all')
-
-        average_demand = {item_id: avg_demand for item_id, avg_demand in results}
-        return average_demand
+        return dict(self.iter_query(query, *item_ids, platform))
 
     def _get_fuzzy_item(self, item_name: str) -> Optional[Dict[str, str]]:
         """
@@ -811,14 +1267,75 @@ class MarketDatabase:
         :param item_name: the item name to get a match for
         :return: the best match if applicable, otherwise None
         """
-        # Check if the item is an ID in self.all_items
-        for item in self.all_items:
-            if item['id'] == item_name:
-                return item
+        # Lookups started before the items or word aliases change must not cache their now stale match, so the
+        # generation is read together with the lookups and aliases they are based on
+        with self.fuzzy_item_lock:
+            generation = self.fuzzy_item_generation
+            all_items, items_by_id, items_by_name, sorted_item_names, item_name_index = self.item_lookups
+            word_aliases = self.word_aliases
+
+        # Check if the item is an ID, the exact name or alias of an item, or the start of only one item's names, before
+        # falling back to fuzzy matching
+        normalized_name = item_name.strip().lower()
+        item = (items_by_id.get(item_name) or items_by_name.get(normalized_name)
+                or self._get_item_by_prefix(normalized_name, items_by_name, sorted_item_names))
+        if item is not None:
+            return item
+
+        # Repeat lookups of the same name skip the fuzzy matching, and are moved to the end of the cache, so the least
+        # recently used lookup is always evicted first. Lookups run in worker threads, so the cache is only touched
+        # while holding the lock, but the matching itself runs outside it.
+        key = item_name.strip()
+        with self.fuzzy_item_lock:
+            if key in self.fuzzy_item_cache:
+                self.fuzzy_item_cache.move_to_end(key)
+                return self.fuzzy_item_cache[key]
+
+        # The word aliases only change through add_word_alias, so they are queried once rather than per lookup
+        if word_aliases is None:
+            word_aliases = self.get_word_aliases()
+            with self.fuzzy_item_lock:
+                if generation == self.fuzzy_item_generation:
+                    self.word_aliases = word_aliases
+
+        best_score, best_item = find_best_match(item_name, all_items, word_aliases, item_name_index)
+        best_item = best_item if best_score > 50 else None
+
+        with self.fuzzy_item_lock:
+            if generation != self.fuzzy_item_generation:
+                return best_item
+
+            self.fuzzy_item_cache[key] = best_item
+            if len(self.fuzzy_item_cache) > FUZZY_ITEM_CACHE_SIZE:
+                self.fuzzy_item_cache.popitem(last=False)
+
+        return best_item
+
+    def _get_item_by_prefix(self, prefix: str, items_by_name: Dict[str, Dict[str, Any]],
+                            sorted_item_names: List[str]) -> Optional[Dict[str, str]]:
+        """
+        Gets the item whose names or aliases start with the given prefix, if they all belong to a single item.
+        The names are kept sorted, so the names starting with the prefix are found with a binary search.
+        :param prefix: the lowercased prefix to look up
+        :param items_by_name: the lowercased item names and aliases to their item, from the same item_lookups as
+                              sorted_item_names
+        :param sorted_item_names: the keys of items_by_name, sorted
+        :return: the item if exactly one item has a name starting with the prefix, otherwise None
+        """
+        if len(prefix) < MIN_PREFIX_MATCH_LENGTH:
+            return None
+
+        match = None
+        for name in islice(sorted_item_names, bisect_left(sorted_item_names, prefix), None):
+            if not name.startswith(prefix):
+                break
 
-        best_score, best_item = find_best_match(item_name, self.all_items, self.get_word_aliases())
+            item = items_by_name[name]
+            if match is not None and item is not match:
+                return None  # Ambiguous, so left to fuzzy matching
+            match = item
 
-        return best_item if best_score > 50 else None
+        return match
 
     def get_item_parts(self, item_id: str) -> Tuple[Tuple[Any, ...], ...]:
         """
@@ -833,7 +1350,7 @@ class MarketDatabase:
         Gets word aliases from the database
         :return: the word aliases
         """
-        return dict(self.execute_query(self._GET_ALL_WORD_ALIASES_QUERY, fetch='all'))
+        return dict(self.iter_query(self._GET_ALL_WORD_ALIASES_QUERY))
 
     async def add_item_alias(self, item_id: str, alias: str) -> None:
         """
@@ -843,11 +1360,11 @@ class MarketDatabase:
         :return: None
         """
         self.execute_query(self._ADD_ITEM_ALIAS_QUERY, item_id, alias, commit=True)
-        self.all_items = self.get_all_items()  # Update the list of all items
+        self.refresh_all_items()  # Update the list of all items
 
     def remove_item_alias(self, item_id: str, alias: str) -> None:
         self.execute_query(self._REMOVE_ITEM_ALIAS_QUERY, item_id, alias, commit=True)
-        self.all_items = self.get_all_items()  # Update the list of all items
+        self.refresh_all_items()  # Update the list of all items
 
     async def add_word_alias(self, word: str, alias: str) -> None:
         """
@@ -857,22 +1374,48 @@ class MarketDatabase:
         :return: None
         """
         self.execute_query(self._ADD_WORD_ALIAS_QUERY, word, alias, commit=True)
+        with self.fuzzy_item_lock:
+            self.word_aliases = None
+            self.fuzzy_item_cache.clear()  # Matches may have changed along with the word aliases
+            self.fuzzy_item_generation += 1
 
     def update_usernames(self) -> None:
         """
         Updates usernames in the database
         :return: None
         """
-        # Fetch all user data first
-        user_data = dict(self.execute_query(self._GET_ALL_USERS_QUERY, fetch='all'))
+        users = self.users.copy()
+        self.users.clear()
+        self._update_usernames(users)
+
+    async def update_usernames_async(self) -> None:
+        """
+        Updates usernames in the database, writing them in a worker thread so the event loop is not blocked
+        :return: None
+        """
+        # The pending users are taken on the event loop thread, which is the one that adds to them
+        users = self.users.copy()
+        self.users.clear()
+        await asyncio.to_thread(self._update_usernames, users)
+
+    def _update_usernames(self, users: Dict[str, str]) -> None:
+        """
+        Updates the usernames of the given users in the database, recording any that changed
+        :param users: dictionary of user ids to their current usernames
+        :return: None
+        """
+        if not users:
+            return
+
+        # Fetch the stored usernames of only the users seen since the last update
+        placeholders = ','.join(['%s'] * len(users))
+        user_data = dict(self.iter_query(self._GET_USERS_QUERY.format(placeholders), *users))
 
         # Prepare batch queries
         update_queries = []
         history_queries = []
         now = datetime.now()
 
-        users = self.users.copy()
-        self.users.clear()
         for user_id, new_ingame_name in users.items():
             current_ingame_name = user_data.get(user_id)
 
@@ -884,12 +1427,15 @@ class MarketDatabase:
                 update_queries.append((user_id, new_ingame_name))
                 history_queries.append((user_id, new_ingame_name, now))
 
-        # Execute the queries
-        if update_queries:
-            self.execute_query(self._UPSERT_USER_QUERY, update_queries, commit=True, many=True)
+        if not update_queries:
+            return
 
-        if history_queries:
-            self.execute_query(self._INSERT_USERNAME_HISTORY_QUERY, history_queries, commit=True, many=True)
+        # Execute both batches on one connection, with a single commit
+        with self.get_connection() as connection:
+            with connection.cursor() as cursor:
+                cursor.executemany(self._UPSERT_USER_QUERY, update_queries)
+                cursor.executemany(self._INSERT_USERNAME_HISTORY_QUERY, history_queries)
+            connection.commit()
 
     def get_item_statistics_dict(self, item_id: str, platform: str = 'pc', order_type: str = 'closed',
                                  start_date: Optional[datetime] = None, end_date: Optional[datetime] = None,
@@ -920,14 +1466,13 @@ class MarketDatabase:
         elif start_date is None:
             start_date = end_date - timedelta(days=364)  # Default to last 365 days
 
-        results = self.execute_query(self._GET_ITEM_STATISTICS_DICT_QUERY,
-                                     item_id, platform, order_type, start_date, end_date,
-                                     fetch='all')
+        results = self.iter_query(self._GET_ITEM_STATISTICS_DICT_QUERY,
+                                  item_id, platform, order_type, start_date, end_date)
 
         return self._process_statistics_results(results, fields)
 
     @staticmethod
-    def _process_statistics_results(results: List[Tuple], fields: Optional[List[str]] = None) -> Dict[
+    def _process_statistics_results(results: Iterable[Tuple], fields: Optional[List[str]] = None) -> Dict[
         str, Dict[str, Any]]:
         """
         Helper function to process and filter statistics results.
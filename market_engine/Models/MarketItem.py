@@ -1,9 +1,16 @@
 import asyncio
+import sys
+from itertools import islice
+from operator import itemgetter
 from typing import List, Dict, Union, Tuple, Coroutine, Any, Optional
 
-from ..Common import fetch_api_data, get_wfm_headers, cache_manager, session_manager
+from ..Common import fetch_api_data, get_wfm_headers, cache_manager, session_manager, AdaptiveConcurrencyLimiter
 from datetime import datetime, timedelta, date
 
+MAX_CONCURRENT_ORDER_FETCHES = 10  # Maximum number of item order requests in flight at once
+order_concurrency_limiter = AdaptiveConcurrencyLimiter(maximum=MAX_CONCURRENT_ORDER_FETCHES)  # Adapts to API health
+
+
 class MarketItem:
     """
     Base class for market items
@@ -12,6 +19,11 @@ class MarketItem:
     base_url: str = "warframe.market/items"  # Base URL for warframe.market items
     asset_url: str = "https://warframe.market/static/assets"  # Base URL for warframe.market assets
 
+    # Many items are created per query, so they skip the per-instance __dict__
+    __slots__ = ('database', 'item_id', 'item_name', 'item_type', 'item_url_name', 'thumb', 'max_rank', 'aliases',
+                 'thumb_url', 'item_url', 'orders', 'parts', 'part_orders_fetched', 'part_price_history_fetched',
+                 'part_demand_history_fetched', 'price_history', 'demand_history', 'last_average_price', 'platform')
+
     def __init__(self, database: "MarketDatabase",
                  item_id: str, item_name: str, item_type: str, item_url_name: str, thumb: str, max_rank: str,
                  aliases: List, platform: str = 'pc') -> None:
@@ -30,7 +42,7 @@ class MarketItem:
         self.database: "MarketDatabase" = database
         self.item_id: str = item_id
         self.item_name: str = item_name
-        self.item_type: str = item_type
+        self.item_type: str = sys.intern(item_type) if item_type is not None else None  # Shared by many items
         self.item_url_name: str = item_url_name
         self.thumb: str = thumb
         self.max_rank: str = max_rank
@@ -79,28 +91,30 @@ class MarketItem:
             tasks.append(obj.get_orders())
 
         if fetch_parts:
-            obj.get_parts()
+            await asyncio.to_thread(obj.get_parts)
 
         if fetch_part_orders:
             tasks += obj.get_part_orders_tasks()
 
         item_ids = [obj.item_id] + [part.item_id for part in obj.parts if part is not None]
 
+        # The history queries run in worker threads, so they overlap with the order requests instead of blocking
+        # the event loop before any of them are sent
+        history_tasks = {}
         if fetch_price_history:
-            price_history = obj.database.get_item_price_history(item_ids, platform)
-            obj.price_history = price_history.get(obj.item_id, {})
-            for part in obj.parts:
-                if part is not None:
-                    part.price_history = price_history.get(part.item_id, {})
+            history_tasks['price_history'] = asyncio.to_thread(obj.database.get_item_price_history, item_ids, platform)
 
         if fetch_demand_history:
-            demand_history = obj.database.get_item_demand_history(item_ids, platform)
-            obj.demand_history = demand_history.get(obj.item_id, {})
+            history_tasks['demand_history'] = asyncio.to_thread(obj.database.get_item_demand_history,
+                                                                item_ids, platform)
+
+        results = await asyncio.gather(*history_tasks.values(), *tasks)
+
+        for attribute, history in zip(history_tasks, results):
+            setattr(obj, attribute, history.get(obj.item_id, {}))
             for part in obj.parts:
                 if part is not None:
-                    part.demand_history = demand_history.get(part.item_id, {})
-
-        await asyncio.gather(*tasks)
+                    setattr(part, attribute, history.get(part.item_id, {}))
 
         return obj
 
@@ -202,17 +216,16 @@ class MarketItem:
         if mode is None:
             mode = {}
 
-        def ensure_list(value):
-            return [value]
-
-        def apply_filter(value: Union[str, int], filter_value: Union[str, List, int], field: str):
+        # Normalizes each filter and looks up its mode once, rather than for every order
+        normalized_filters = []
+        for field, filter_value in filters.items():
             if isinstance(filter_value, str):
-                filter_value = ensure_list(filter_value)
+                filter_value = [filter_value]
 
-            if filter_value is None:
-                return True
-            filter_mode = mode.get(field)
+            if filter_value is not None:
+                normalized_filters.append((field, filter_value, mode.get(field)))
 
+        def apply_filter(value: Union[str, int], filter_value: Union[List, int], filter_mode: Optional[str]):
             if isinstance(value, int):
                 if filter_mode == 'greater':
                     return value > filter_value
@@ -228,10 +241,12 @@ class MarketItem:
 
         orders = self.orders[order_type]
 
-        filtered_orders = [order for order in orders if all(
-            apply_filter(order.get(key), filter_value, key) for key, filter_value in filters.items())]
+        # Stops at the first num_orders matches, as the orders are already sorted
+        filtered_orders = (order for order in orders if all(
+            apply_filter(order.get(field), filter_value, filter_mode)
+            for field, filter_value, filter_mode in normalized_filters))
 
-        return filtered_orders[:num_orders]
+        return list(islice(filtered_orders, num_orders))
 
     async def parse_orders(self, orders: List[Dict[str, Any]]) -> None:
         """
@@ -263,11 +278,13 @@ class MarketItem:
 
             self.orders[order_type].append(parsed_order)
 
-        for key, reverse in [('sell', False), ('buy', True)]:
-            # First sort by 'last_update' in descending order
-            self.orders[key] = sorted(self.orders[key], key=lambda x: x['last_update'], reverse=True)
-            # Then sort by 'price' according to the 'reverse' flag
-            self.orders[key] = sorted(self.orders[key], key=lambda x: x['price'], reverse=reverse)
+        # Buy orders are sorted by price and then 'last_update', both descending, in a single pass
+        self.orders['buy'].sort(key=itemgetter('price', 'last_update'), reverse=True)
+
+        # Sell orders are sorted by 'last_update' in descending order, then by price in ascending order, relying on
+        # the sort being stable; sorted in place, as filter_orders filters the full list before taking the top orders
+        self.orders['sell'].sort(key=itemgetter('last_update'), reverse=True)
+        self.orders['sell'].sort(key=itemgetter('price'))
 
         self.database.users.update(users)
 
@@ -281,7 +298,8 @@ class MarketItem:
                                           session=session,
                                           url=f"{self.base_api_url}/items/{self.item_url_name}/orders",
                                           headers=get_wfm_headers(platform=self.platform),
-                                          expiration=60)
+                                          expiration=60,
+                                          concurrency_limiter=order_concurrency_limiter)
             if orders is None:
                 return
 
@@ -1,7 +1,10 @@
 import asyncio
-from typing import Dict, List, Union, Any
+from typing import Dict, List, Union, Any, Set, Tuple
 
-from ..Common import fetch_api_data, cache_manager, session_manager
+import orjson
+
+from ..Common import fetch_api_data, cache_manager, session_manager, get_cache_key, get_cached_data_many, \
+    set_cached_data_many
 
 
 class MarketUser:
@@ -35,7 +38,8 @@ class MarketUser:
         self.status = None
         self.region = None
         self.orders: Dict[str, List[Dict[str, Union[str, int]]]] = {'buy': [], 'sell': []}
-        self.reviews: List[str] = []
+        self.reviews: List[Dict[str, str]] = []
+        self.review_keys: Set[Tuple[str, ...]] = set()  # Every parsed review's values, to skip duplicates
 
     @classmethod
     async def create(cls, database: "MarketDatabase", user_id: str, username: str,
@@ -151,7 +155,9 @@ class MarketUser:
                 'date': review['date'],
             }
 
-            if parsed_review not in self.reviews:
+            review_key = tuple(parsed_review.values())
+            if review_key not in self.review_keys:
+                self.review_keys.add(review_key)
                 self.reviews.append(parsed_review)
 
     async def fetch_orders(self) -> None:
@@ -179,20 +185,29 @@ class MarketUser:
         if isinstance(page_nums, int):
             page_nums = [page_nums]
 
-        tasks = []
+        urls = [f"{self.base_api_url}/profile/{self.username}/reviews/{page_num}" for page_num in page_nums]
+        cache_keys = [get_cache_key(url, {}) for url in urls]
+
         async with session_manager() as session, cache_manager() as cache:
-            for page_num in page_nums:
-                url = f"{self.base_api_url}/profile/{self.username}/reviews/{page_num}"
-                tasks.append(fetch_api_data(session=session,
-                                            url=url,
-                                            cache=cache,
-                                            expiration=60))
-
-            results = await asyncio.gather(*tasks)
-
-            for reviews in results:
-                if reviews is not None:
-                    self.parse_reviews(reviews['payload']['reviews'])
+            # Looks up every page in a single round trip, so only cache misses hit the API
+            responses = await get_cached_data_many(cache, cache_keys)
+
+            # Fetches the raw response bodies, so they can be cached as-is and only need to be parsed once
+            missing = [i for i, response in enumerate(responses) if response is None]
+            fetched = await asyncio.gather(*[fetch_api_data(session=session, url=urls[i], return_type='bytes')
+                                             for i in missing])
+
+            cache_writes = {}
+            for i, response in zip(missing, fetched):
+                responses[i] = response
+                if response is not None:
+                    cache_writes[cache_keys[i]] = response
+
+            await set_cached_data_many(cache, cache_writes, expiration=60)
+
+        for response in responses:
+            if response is not None:
+                self.parse_reviews(orjson.loads(response)['payload']['reviews'])
 
     def to_dict(self):
         """
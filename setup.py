@@ -10,14 +10,13 @@ setup(
     install_requires=[
         'aiohttp~=3.9.3',
         'aiolimiter~=1.1.0',
+        'orjson~=3.9.15',
         'redis~=5.0.3',
+        'zstandard~=0.22.0',
         'requests~=2.31.0',
-        'beautifulsoup4~=4.12.2',
         'PyMySQL~=1.1.0',
-        'fuzzywuzzy~=0.18.0',
+        'rapidfuzz~=3.6.1',
         'pytz~=2023.3',
-        'python-Levenshtein~=0.25.0',
-        'beautifulsoup4~=4.12.2',
         'Markdown~=3.4.3',
         'cryptography~=42.0.5',
         'tenacity~=8.2.2',